@@ -2,18 +2,18 @@
 add_test_to_dataset.py
 Author: Lennin Abrão Sousa Santos
 Data criação: 2026-02-06
-Date update: 2026-02-06
+Date update: 2026-10-17
 Explicação: Processes test images and adds them to the training dataset with '_m' suffix
-How to use: uv run python mlsc/add_test_to_dataset.py
+How to use: uv run python mlsc/add_test_to_dataset.py [--workers K] [--incremental]
 Licença: AGPL3
 """
 
 from pathlib import Path
-from PIL import Image
-import torchvision.transforms as T
+import argparse
+from mlsc.preprocess import process_jobs
 
 
-def add_test_images_to_dataset():
+def add_test_images_to_dataset(workers=1, incremental=False):
     """
     Processes images from data/test and adds them to dataset/ with '_m' suffix.
     
@@ -22,6 +22,10 @@ def add_test_images_to_dataset():
     2. Converted to grayscale
     3. Renamed with '_m' suffix (before extension)
     4. Saved to dataset/ directory
+
+    Args:
+        workers: Processes used to resize/grayscale images (default: 1)
+        incremental: Skip images unchanged since the previous run
     """
     # Define paths
     base_dir = Path(__file__).parent.parent
@@ -35,20 +39,12 @@ def add_test_images_to_dataset():
     # Create dataset directory if it doesn't exist
     dataset_dir.mkdir(parents=True, exist_ok=True)
     
-    # Define preprocessing transform (same as training)
-    # Resize to 64x64, convert to grayscale
-    transform = T.Compose([
-        T.Resize((64, 64)),
-        T.Grayscale(num_output_channels=1)
-    ])
-    
-    processed_count = 0
-    
     print(f"Processing test images from {test_dir}")
     print(f"Adding to dataset: {dataset_dir}")
     print("-" * 60)
     
     # Process both circle and square subdirectories
+    jobs = []
     for class_name in ["circle", "square"]:
         class_dir = test_dir / class_name
         
@@ -56,39 +52,50 @@ def add_test_images_to_dataset():
             print(f"Warning: {class_dir} does not exist, skipping...")
             continue
         
-        print(f"\nProcessing {class_name} images...")
-        
-        # Process each image in the subdirectory
+        # Create new filename with '_m' suffix
+        # e.g., "circle_001.png" -> "circle_001_m.png"
         for img_path in sorted(class_dir.glob("*.png")):
-            # Load and transform image
-            img = Image.open(img_path)
-            img_processed = transform(img)
-            
-            # Create new filename with '_m' suffix
-            # e.g., "circle_001.png" -> "circle_001_m.png"
-            original_name = img_path.stem  # filename without extension
-            new_name = f"{original_name}_m.png"
-            
-            # Save to dataset directory
-            output_path = dataset_dir / new_name
-            img_processed.save(output_path)
-            
-            processed_count += 1
-            
-            if processed_count % 10 == 0:
-                print(f"  Processed {processed_count} images...")
+            jobs.append((img_path, dataset_dir / f"{img_path.stem}_m.png"))
+    
+    processed_count, skipped_count = process_jobs(jobs, dataset_dir, workers, incremental)
     
     print("-" * 60)
     print(f"✓ Successfully processed {processed_count} images")
+    if incremental:
+        print(f"✓ Skipped {skipped_count} unchanged images")
     print(f"✓ Images saved to {dataset_dir}")
     print("\nNext steps:")
     print("  1. Verify the images in the dataset directory")
     print("  2. Retrain the model with: uv run mlsc train")
 
 
-if __name__ == "__main__":
+def main():
+    """CLI entry point for add_test_to_dataset script."""
+    parser = argparse.ArgumentParser(
+        description="Add data/test images to dataset/ with '_m' suffix"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Parallel processes (default: 1)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip images unchanged since the previous run"
+    )
+
+    args = parser.parse_args()
+
     try:
-        add_test_images_to_dataset()
+        add_test_images_to_dataset(args.workers, args.incremental)
     except Exception as e:
         print(f"Error: {e}")
-        exit(1)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,138 @@
+"""
+batching.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Asyncio micro-batching of concurrent inference requests into single forward passes.
+How to use: Used internally by serve.py, or embedded in any asyncio service
+Licença: AGPL3
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+class MicroBatcher:
+    def __init__(self, model, device, max_batch_size=64, max_wait_ms=2.0):
+        """
+        Collects single-image requests from concurrent callers and runs them
+        through the model as one batch.
+
+        A batch is dispatched as soon as it holds max_batch_size images or
+        max_wait_ms after its first image arrived, whichever comes first, so
+        throughput grows with load while latency stays bounded. Forward
+        passes run on a dedicated thread; the event loop keeps collecting the
+        next batch meanwhile.
+
+        Args:
+            model: Model in eval mode (e.g. from predict.load_model)
+            device: torch.device of the model
+            max_batch_size (int): Largest batch sent to the model.
+            max_wait_ms (float): Longest time a request waits for company.
+
+        Example:
+            batcher = MicroBatcher(model, device)
+            await batcher.start()
+            logits = await batcher.predict(image)  # image: (1, 64, 64) normalized
+            await batcher.stop()
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"Max batch size must be positive, got {max_batch_size}")
+        if max_wait_ms < 0:
+            raise ValueError(f"Max wait must be >= 0, got {max_wait_ms}")
+
+        self.model = model
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._task = None
+        self._executor = None
+        # Requests taken off the queue and not answered yet
+        self._batch = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mlsc-forward")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown(wait=True)
+        # Fail the batch being collected or run, and requests that never made
+        # it into a batch
+        pending = self._batch
+        self._batch = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("MicroBatcher stopped"))
+
+    async def predict(self, image):
+        """
+        Args:
+            image: Normalized tensor (1, 64, 64)
+
+        Returns:
+            Logits tensor (2,) on the CPU
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    async def predict_many(self, images):
+        """Submits each image separately so they can share batches with other callers."""
+        return await asyncio.gather(*(self.predict(image) for image in images))
+
+    def _forward(self, images):
+        with torch.inference_mode():
+            return self.model(images.to(self.device)).cpu()
+
+    async def _collect(self):
+        self._batch = batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Callers may have given up (e.g. cancelled) while queued
+            self._batch = batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                images = torch.stack([image for image, _ in batch])
+                logits = await loop.run_in_executor(self._executor, self._forward, images)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                self._batch = []
+                continue
+
+            for (_, future), row in zip(batch, logits):
+                if not future.done():
+                    future.set_result(row)
+            self._batch = []
@@ -0,0 +1,322 @@
+"""
+bench.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Benchmarks generation, preprocessing, dataset loading, training and inference, writing a JSON report.
+How to use: uv run mlsc bench [--stages generate preprocess dataset train inference] [--output bench.json]
+Licença: AGPL3
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from mlsc.dataset import ShapesDataset
+from mlsc.generate_data import generate_dataset
+from mlsc.model import SimpleCNN
+from mlsc.predict import load_model
+from mlsc.preprocess import preprocess_images
+from mlsc.train import train
+
+STAGES = ("generate", "preprocess", "dataset", "train", "inference")
+DEFAULT_BATCH_SIZES = (1, 8, 32, 128, 256)
+
+
+def timed(fn, *args, **kwargs):
+    """Runs fn with its progress prints silenced; returns the wall time in seconds."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def git_commit():
+    """Commit the benchmarked tree was built from, or None outside git."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(device):
+    """Machine and library versions, so reports from different hosts can be told apart."""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "device": str(device),
+    }
+
+
+def bench_generate(output_dir, count, workers, seed, backend):
+    elapsed = timed(generate_dataset, count, workers, seed, output_dir, backend)
+    return {
+        "images": 2 * count,
+        "workers": workers,
+        "backend": backend,
+        "seconds": elapsed,
+        "images_per_sec": 2 * count / elapsed,
+    }
+
+
+def bench_preprocess(input_dir, output_dir, workers):
+    count = len(list(Path(input_dir).glob("*/*.png")))
+    elapsed = timed(preprocess_images, input_dir, output_dir, workers)
+    return {
+        "images": count,
+        "workers": workers,
+        "seconds": elapsed,
+        "images_per_sec": count / elapsed,
+    }
+
+
+def bench_dataset(data_dir):
+    """Decodes and normalizes every sample of ShapesDataset once."""
+    dataset = ShapesDataset(data_dir)
+    start = time.perf_counter()
+    for i in range(len(dataset)):
+        dataset[i]
+    elapsed = time.perf_counter() - start
+    return {
+        "images": len(dataset),
+        "seconds": elapsed,
+        "images_per_sec": len(dataset) / elapsed,
+    }
+
+
+def bench_train(work_dir, steps, batch_size, seed):
+    """
+    Times the training steps of train.train() on the synthetic stream, so
+    the result measures the training step and not disk I/O. Two epochs are
+    run and only the second one's step loop is kept, leaving out setup,
+    warm-up, validation and model saving.
+    """
+    with contextlib.chdir(work_dir), open(os.devnull, "w") as devnull:
+        # train() writes model.pth to the cwd
+        with contextlib.redirect_stdout(devnull):
+            metrics = train(batch_size=batch_size, num_epochs=2, synthetic=True,
+                            steps_per_epoch=steps, seed=seed)
+    elapsed = metrics["train_seconds"][-1]
+    return {
+        "steps": steps,
+        "batch_size": batch_size,
+        "seconds": elapsed,
+        "steps_per_sec": steps / elapsed,
+        "samples_per_sec": steps * batch_size / elapsed,
+    }
+
+
+def bench_inference(model, device, batch_sizes, iterations, warmup=3):
+    """Latency percentiles and throughput of one forward pass per batch size."""
+    results = []
+    with torch.inference_mode():
+        for batch_size in batch_sizes:
+            images = torch.randn(batch_size, 1, 64, 64, device=device)
+            latencies = []
+            for i in range(warmup + iterations):
+                start = time.perf_counter()
+                model(images)
+                if device.type == "cuda":
+                    torch.cuda.synchronize()
+                if i >= warmup:
+                    latencies.append(time.perf_counter() - start)
+
+            latencies_ms = np.array(latencies) * 1000
+            results.append({
+                "batch_size": batch_size,
+                "iterations": iterations,
+                "p50_ms": float(np.percentile(latencies_ms, 50)),
+                "p90_ms": float(np.percentile(latencies_ms, 90)),
+                "p99_ms": float(np.percentile(latencies_ms, 99)),
+                "mean_ms": float(latencies_ms.mean()),
+                "images_per_sec": float(batch_size * 1000 / latencies_ms.mean()),
+            })
+    return results
+
+
+def run_benchmarks(
+    stages=STAGES,
+    count=500,
+    workers=1,
+    seed=0,
+    backend="pil",
+    train_steps=20,
+    train_batch_size=32,
+    batch_sizes=DEFAULT_BATCH_SIZES,
+    iterations=50,
+    model_path=None,
+    output=None,
+):
+    """
+    Runs the selected benchmark stages in a scratch directory and returns the
+    report. Every stage uses fixed sizes and seeds, so reports of different
+    commits on the same machine are directly comparable.
+
+    Args:
+        stages: Stages to run (subset of STAGES)
+        count: Images per class for generate/preprocess/dataset
+        workers: Processes used by generate and preprocess
+        seed: Seed for the generated data, the synthetic training stream
+            and the untrained inference model
+        backend: Generation backend ("pil" or "numpy")
+        train_steps: Training steps timed
+        train_batch_size: Training batch size
+        batch_sizes: Batch sizes for the inference benchmark
+        iterations: Timed forward passes per batch size
+        model_path: Model for the inference benchmark (default: an untrained
+            SimpleCNN, which runs the same kernels)
+        output: Path of the JSON report (optional)
+
+    Returns:
+        Report dictionary
+    """
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)}, expected some of {STAGES}")
+
+    if count < 1:
+        raise ValueError(f"Count must be positive, got {count}")
+
+    if iterations < 1:
+        raise ValueError(f"Iterations must be positive, got {iterations}")
+
+    device = torch.device(
+        "cuda"
+        if torch.cuda.is_available()
+        else ("mps" if torch.backends.mps.is_available() else "cpu")
+    )
+
+    report = {
+        "environment": environment(device),
+        "config": {
+            "count": count,
+            "workers": workers,
+            "seed": seed,
+            "backend": backend,
+            "train_steps": train_steps,
+            "train_batch_size": train_batch_size,
+            "batch_sizes": list(batch_sizes),
+            "iterations": iterations,
+            "model": str(model_path) if model_path else None,
+        },
+    }
+
+    with tempfile.TemporaryDirectory(prefix="mlsc_bench_") as tmp:
+        raw_dir = Path(tmp) / "raw"
+        processed_dir = Path(tmp) / "processed"
+
+        # preprocess and dataset read the generated images
+        if {"generate", "preprocess", "dataset"} & set(stages):
+            result = bench_generate(raw_dir, count, workers, seed, backend)
+            if "generate" in stages:
+                report["generate"] = result
+                print(f"✓ generate: {result['images_per_sec']:.0f} images/s")
+
+        if "preprocess" in stages:
+            report["preprocess"] = bench_preprocess(raw_dir, processed_dir, workers)
+            print(f"✓ preprocess: {report['preprocess']['images_per_sec']:.0f} images/s")
+
+        if "dataset" in stages:
+            report["dataset"] = bench_dataset(raw_dir)
+            print(f"✓ dataset: {report['dataset']['images_per_sec']:.0f} images/s")
+
+        if "train" in stages:
+            report["train"] = bench_train(tmp, train_steps, train_batch_size, seed)
+            print(
+                f"✓ train: {report['train']['steps_per_sec']:.1f} steps/s "
+                f"({report['train']['samples_per_sec']:.0f} samples/s)"
+            )
+
+    if "inference" in stages:
+        if model_path is not None:
+            model = load_model(Path(model_path), device)
+        else:
+            torch.manual_seed(seed)
+            model = SimpleCNN().to(device).eval()
+        report["inference"] = bench_inference(model, device, batch_sizes, iterations)
+        for result in report["inference"]:
+            print(
+                f"✓ inference batch {result['batch_size']:4d}: "
+                f"p50 {result['p50_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms, "
+                f"{result['images_per_sec']:.0f} images/s"
+            )
+
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report saved to {output}")
+
+    return report
+
+
+def main():
+    """CLI entry point for bench command."""
+    parser = argparse.ArgumentParser(description="Benchmark the mlsc pipeline")
+    parser.add_argument(
+        "--stages", nargs="+", choices=STAGES, default=list(STAGES),
+        help="Stages to run (default: all)"
+    )
+    parser.add_argument("--count", type=int, default=500, help="Images per class (default: 500)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for generate/preprocess (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--backend", choices=["pil", "numpy"], default="pil", help="Generation backend (default: pil)")
+    parser.add_argument("--train-steps", type=int, default=20, help="Timed training steps (default: 20)")
+    parser.add_argument("--train-batch-size", type=int, default=32, help="Training batch size (default: 32)")
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=list(DEFAULT_BATCH_SIZES),
+        help="Inference batch sizes (default: 1 8 32 128 256)"
+    )
+    parser.add_argument("--iterations", type=int, default=50, help="Timed forward passes per batch size (default: 50)")
+    parser.add_argument("--model", type=str, default=None, help="Model to benchmark (default: untrained SimpleCNN)")
+    parser.add_argument("--output", type=str, default="bench.json", help="JSON report path (default: bench.json)")
+
+    args = parser.parse_args()
+
+    try:
+        run_benchmarks(
+            args.stages,
+            args.count,
+            args.workers,
+            args.seed,
+            args.backend,
+            args.train_steps,
+            args.train_batch_size,
+            args.batch_sizes,
+            args.iterations,
+            args.model,
+            args.output,
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
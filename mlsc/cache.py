@@ -0,0 +1,206 @@
+"""
+cache.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Content-addressed on-disk caches of preprocessed (normalized 64x64) image arrays and of model predictions.
+How to use: Used by mlsc train / mlsc predict (--cache-dir, --cache-size, --prediction-cache, --rescore, --no-cache)
+Licença: AGPL3
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from mlsc.preprocess import TRANSFORM_SIGNATURE, file_sha256, normalized_array
+
+DEFAULT_CACHE_SIZE_MB = 1024
+CACHE_ROOT = Path(__file__).parent.parent / "data" / ".cache"
+
+
+def default_cache_dir():
+    return CACHE_ROOT / "tensors"
+
+
+def default_prediction_cache():
+    return CACHE_ROOT / "predictions.sqlite"
+
+
+class TensorCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_SIZE_MB * 2**20):
+        """
+        On-disk cache of normalized_array() results, one .npy file per image.
+
+        Entries are keyed by the SHA-256 of the image bytes plus the transform
+        signature, so renamed or copied files still hit, edited files miss,
+        and a change to the preprocessing invalidates everything at once.
+
+        The cache is bounded to `max_bytes`: every hit refreshes the entry's
+        mtime, and when the total grows past the bound the least recently
+        used entries are deleted. Entries are written atomically, so several
+        processes (DataLoader workers, concurrent runs) can share a directory,
+        and the counters and size accounting are locked, so several threads
+        (predict's decode pool) can share one instance.
+
+        The directory is only scanned for its size on the first store, so
+        runs that hit every entry never stat the whole cache.
+
+        Args:
+            cache_dir (str or Path): Cache directory (default: data/.cache/tensors).
+            max_bytes (int): Size bound of the cache.
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size = None  # bytes on disk, unknown until the first store
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Locks cannot be pickled (DataLoader workers under spawn)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _entries(self):
+        """Yields (path, mtime, size) of every cached array."""
+        for entry in self.cache_dir.glob("*/*.npy"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            yield entry, stat.st_mtime, stat.st_size
+
+    def _entry_path(self, image_path, image_hash=None):
+        if image_hash is None:
+            image_hash = file_sha256(image_path)
+        key = hashlib.sha256(f"{TRANSFORM_SIGNATURE}:{image_hash}".encode()).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.npy"
+
+    def load(self, image_path, image_hash=None):
+        """
+        Normalized (64, 64) float32 array of the image, from the cache if possible.
+        `image_hash` is the file_sha256() of the image, when the caller already has it.
+        """
+        entry = self._entry_path(image_path, image_hash)
+        try:
+            array = np.load(entry)
+            os.utime(entry)
+            with self._lock:
+                self.hits += 1
+            return array
+        except (OSError, ValueError, EOFError):  # missing, evicted or corrupt
+            pass
+
+        with self._lock:
+            self.misses += 1
+        array = normalized_array(Image.open(image_path))
+        self._store(entry, array)
+        return array
+
+    def _store(self, entry, array):
+        entry.parent.mkdir(exist_ok=True)
+        tmp_path = entry.with_name(f"{entry.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, entry)
+        entry_size = entry.stat().st_size
+
+        with self._lock:
+            if self.size is None:
+                # The scan already counts the entry just written
+                self.size = sum(size for _, _, size in self._entries())
+            else:
+                self.size += entry_size
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def evict(self, target=0.9):
+        """Deletes least recently used entries until the cache fits target * max_bytes."""
+        with self._lock:
+            self._evict(target)
+
+    def _evict(self, target=0.9):
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        self.size = sum(size for _, _, size in entries)
+        for entry, _, size in entries:
+            if self.size <= target * self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            self.size -= size
+
+
+def open_cache(cache_dir=None, cache_size_mb=DEFAULT_CACHE_SIZE_MB):
+    """TensorCache with a size bound in megabytes; cache_size_mb=0 disables caching (returns None)."""
+    if cache_size_mb <= 0:
+        return None
+    return TensorCache(cache_dir, int(cache_size_mb * 2**20))
+
+
+class PredictionCache:
+    # SQLite limits the number of parameters of a statement
+    QUERY_CHUNK = 500
+
+    def __init__(self, db_path=None):
+        """
+        SQLite table of model outputs (float32 logits) keyed by (model key,
+        image content hash), so images already scored by the same model are
+        not run through it again. Safe to share between concurrent runs.
+
+        Args:
+            db_path (str or Path): Database file (default: data/.cache/predictions.sqlite).
+        """
+        self.db_path = Path(db_path) if db_path is not None else default_prediction_cache()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "model TEXT NOT NULL, image TEXT NOT NULL, logits BLOB NOT NULL, "
+            "PRIMARY KEY (model, image)) WITHOUT ROWID"
+        )
+
+    @staticmethod
+    def model_key(model_path, variant=""):
+        """
+        Key of a model: hash of its weights file and of `variant`, which names
+        whatever else changes its outputs (backend, precision).
+        """
+        return hashlib.sha256(f"{variant}:{file_sha256(model_path)}".encode()).hexdigest()
+
+    def get(self, model_key, image_hashes):
+        """Returns {image hash: logits array} for the hashes scored by this model."""
+        found = {}
+        image_hashes = list(dict.fromkeys(image_hashes))
+        for i in range(0, len(image_hashes), self.QUERY_CHUNK):
+            chunk = image_hashes[i:i + self.QUERY_CHUNK]
+            rows = self.conn.execute(
+                f"SELECT image, logits FROM predictions WHERE model = ? "
+                f"AND image IN ({', '.join('?' * len(chunk))})",
+                (model_key, *chunk),
+            )
+            for image_hash, logits in rows:
+                found[image_hash] = np.frombuffer(logits, dtype=np.float32)
+        return found
+
+    def put(self, model_key, image_hashes, logits):
+        """Stores one row of `logits` (N x classes) per image hash."""
+        logits = np.ascontiguousarray(logits, dtype=np.float32)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO predictions (model, image, logits) VALUES (?, ?, ?)",
+                [(model_key, image_hash, row.tobytes()) for image_hash, row in zip(image_hashes, logits)],
+            )
+
+    def close(self):
+        self.conn.close()
@@ -2,18 +2,19 @@
 cli.py
 Author: Lennin Abrão Sousa Santos
 Data criação: 2026-01-29
-Date update: 2026-02-02
+Date update: 2026-10-17
 Explicação: Main entry point for the MLSC CLI.
-How to use: uv run mlsc {generate|train|organize-test|preprocess|predict}
+How to use: uv run mlsc {generate|train|organize-test|preprocess|pack|predict|serve|export|quantize|bench|sweep}
 Licença: AGPL3
 """
 import argparse
+import os
 import sys
-from mlsc import generate_data
-from mlsc import train
-from mlsc import organize_test_data
-from mlsc import preprocess
-from mlsc import predict
+from pathlib import Path
+
+# Subcommand modules are imported only when their command runs, so that
+# `mlsc --help` or `mlsc organize-test` never pay for importing torch.
+PROJECT_DIR = Path(__file__).parent.parent
 
 
 def main():
@@ -23,10 +24,178 @@ def main():
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # Subcommand: generate
-    subparsers.add_parser("generate", help="Generate synthetic data")
+    generate_parser = subparsers.add_parser("generate", help="Generate synthetic data")
+    generate_parser.add_argument(
+        "--count", type=int, default=1000, help="Images per class (default: 1000)"
+    )
+    generate_parser.add_argument(
+        "--workers", type=int, default=1, help="Parallel processes (default: 1)"
+    )
+    generate_parser.add_argument(
+        "--seed", type=int, default=None, help="Base random seed (default: random)"
+    )
+    generate_parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Output directory (default: data/raw, or data/packed with --packed)",
+    )
+    generate_parser.add_argument(
+        "--backend",
+        choices=["pil", "numpy"],
+        default=None,
+        help="pil: ImageDraw per image, numpy: vectorized batches (default: pil, numpy with --packed)",
+    )
+    generate_parser.add_argument(
+        "--packed",
+        action="store_true",
+        help="Write a packed dataset instead of PNGs (numpy backend)",
+    )
 
     # Subcommand: train
-    subparsers.add_parser("train", help="Train the model")
+    train_parser = subparsers.add_parser("train", help="Train the model")
+    train_parser.add_argument(
+        "--packed",
+        type=str,
+        nargs="?",
+        const=str(PROJECT_DIR / "data" / "packed"),
+        default=None,
+        help="Train from a packed dataset (default dir: data/packed)",
+    )
+    train_parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Train on an endless stream of generated shapes (no files needed)",
+    )
+    train_parser.add_argument(
+        "--steps-per-epoch",
+        type=int,
+        default=50,
+        help="Batches per epoch with --synthetic (default: 50)",
+    )
+    train_parser.add_argument(
+        "--seed", type=int, default=None, help="Seed of the --synthetic stream (default: random)"
+    )
+    train_parser.add_argument(
+        "--in-memory",
+        action="store_true",
+        help="Load the whole dataset into one tensor and slice batches from it",
+    )
+    train_parser.add_argument(
+        "--output",
+        type=str,
+        default="model.pth",
+        help="Where the best model is saved (default: model.pth)",
+    )
+    train_parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="Checkpoint path (model, optimizer, epoch, RNG state) written during training",
+    )
+    train_parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=1,
+        help="Epochs between checkpoints (default: 1)",
+    )
+    train_parser.add_argument(
+        "--resume",
+        type=str,
+        default=None,
+        help="Continue training from this checkpoint (--epochs is the total)",
+    )
+    train_parser.add_argument(
+        "--patience",
+        type=int,
+        default=None,
+        help="Stop after N epochs without validation accuracy improvement",
+    )
+    train_parser.add_argument(
+        "--distributed",
+        action="store_true",
+        help="Data-parallel training over the processes started by torchrun",
+    )
+    train_parser.add_argument(
+        "--dist-backend",
+        choices=["gloo", "nccl"],
+        default="gloo",
+        help="gloo: CPU processes on one or many hosts, nccl: one GPU per process (default: gloo)",
+    )
+    train_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print per-stage times, samples/s and peak memory for every epoch",
+    )
+    train_parser.add_argument(
+        "--profile-trace",
+        type=str,
+        default=None,
+        help="Write a torch.profiler Chrome trace of the first training steps",
+    )
+    train_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Decode every image instead of using the preprocessed tensor cache",
+    )
+    train_parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Tensor cache directory (default: data/.cache/tensors)",
+    )
+    train_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Tensor cache size bound in MB, least recently used entries are evicted (default: 1024)",
+    )
+    train_parser.add_argument(
+        "--precision",
+        choices=("fp32", "bf16", "fp16"),
+        default="fp32",
+        help="Autocast precision (bf16 on CPU/GPU, fp16 on CUDA)",
+    )
+    train_parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Run channels-last and compiled with torch.compile (falls back to eager)",
+    )
+    train_parser.add_argument(
+        "--batch-size", type=int, default=32, help="Training batch size (default: 32)"
+    )
+    train_parser.add_argument(
+        "--val-batch-size",
+        type=int,
+        default=None,
+        help="Validation batch size (default: same as --batch-size)",
+    )
+    train_parser.add_argument(
+        "--lr", type=float, default=0.001, help="Learning rate (default: 0.001)"
+    )
+    train_parser.add_argument(
+        "--epochs", type=int, default=10, help="Number of epochs (default: 10)"
+    )
+    train_parser.add_argument(
+        "--num-workers",
+        type=int,
+        default=0,
+        help="DataLoader worker processes (default: 0, main process)",
+    )
+    train_parser.add_argument(
+        "--pin-memory", action="store_true", help="Pin host memory for faster GPU copies"
+    )
+    train_parser.add_argument(
+        "--persistent-workers",
+        action="store_true",
+        help="Keep DataLoader workers alive between epochs (needs --num-workers > 0)",
+    )
+    train_parser.add_argument(
+        "--prefetch-factor",
+        type=int,
+        default=None,
+        help="Batches prefetched per worker (needs --num-workers > 0)",
+    )
 
     # Subcommand: organize-test
     organize_parser = subparsers.add_parser(
@@ -49,13 +218,35 @@ def main():
     preprocess_parser.add_argument(
         "--output", type=str, default=None, help="Output directory (default: data/processed)"
     )
+    preprocess_parser.add_argument(
+        "--workers", type=int, default=1, help="Parallel processes (default: 1)"
+    )
+    preprocess_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip images unchanged since the previous run",
+    )
+
+    # Subcommand: pack
+    pack_parser = subparsers.add_parser(
+        "pack", help="Pack PNG images into a memory-mappable array"
+    )
+    pack_parser.add_argument(
+        "--input", type=str, default=None, help="Input directory (default: data/raw)"
+    )
+    pack_parser.add_argument(
+        "--output", type=str, default=None, help="Output directory (default: data/packed)"
+    )
 
     # Subcommand: predict
     predict_parser = subparsers.add_parser(
         "predict", help="Run inference on test images"
     )
     predict_parser.add_argument(
-        "--model", type=str, default="model.pth", help="Path to trained model (default: model.pth)"
+        "--model",
+        type=str,
+        default="model.pth",
+        help="Path to trained model, .pth or exported .pt2/.onnx (default: model.pth)",
     )
     predict_parser.add_argument(
         "--data", type=str, required=True, help="Path to preprocessed test data"
@@ -63,13 +254,253 @@ def main():
     predict_parser.add_argument(
         "--output", type=str, default=None, help="Path to save results CSV (default: auto-generated)"
     )
+    predict_parser.add_argument(
+        "--backend",
+        choices=["auto", "torch", "onnx"],
+        default="auto",
+        help="Inference backend (default: auto, ONNX Runtime for .onnx models)",
+    )
+    predict_parser.add_argument(
+        "--prediction-cache",
+        type=str,
+        default=None,
+        help="Prediction cache database (default: data/.cache/predictions.sqlite)",
+    )
+    predict_parser.add_argument(
+        "--rescore",
+        action="store_true",
+        help="Run the model on every image, refreshing cached predictions",
+    )
+    predict_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disable the tensor and prediction caches",
+    )
+    predict_parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Tensor cache directory (default: data/.cache/tensors)",
+    )
+    predict_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Tensor cache size bound in MB, least recently used entries are evicted (default: 1024)",
+    )
+    predict_parser.add_argument(
+        "--precision",
+        choices=("fp32", "bf16", "fp16"),
+        default="fp32",
+        help="Autocast precision (bf16 on CPU/GPU, fp16 on CUDA)",
+    )
+    predict_parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Run channels-last and compiled with torch.compile (falls back to eager)",
+    )
+    predict_parser.add_argument(
+        "--batch-size", type=int, default=256, help="Images per forward pass (default: 256)"
+    )
+    predict_parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="Threads decoding images ahead of the model (0 = main thread)",
+    )
+    predict_parser.add_argument(
+        "--prefetch", type=int, default=None, help="Max batches decoded ahead (default: 2 * workers)"
+    )
+
+    # Subcommand: serve
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve predictions over HTTP with a warm model"
+    )
+    serve_parser.add_argument(
+        "--model",
+        type=str,
+        default="model.pth",
+        help="Path to trained model, .pth or exported .pt2/.onnx (default: model.pth)",
+    )
+    serve_parser.add_argument(
+        "--backend",
+        choices=["auto", "torch", "onnx"],
+        default="auto",
+        help="Inference backend (default: auto, ONNX Runtime for .onnx models)",
+    )
+    serve_parser.add_argument(
+        "--host", type=str, default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)"
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=8000, help="TCP port (default: 8000)"
+    )
+    serve_parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=64,
+        help="Largest batch of images per forward pass (default: 64)",
+    )
+    serve_parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=2.0,
+        help="Longest time an image waits for others to batch with (default: 2)",
+    )
+
+    # Subcommand: export
+    export_parser = subparsers.add_parser(
+        "export", help="Export the trained model as a torch.export (.pt2) or ONNX artifact"
+    )
+    export_parser.add_argument(
+        "--model", type=str, default="model.pth", help="Path to trained model (default: model.pth)"
+    )
+    export_parser.add_argument(
+        "--output", type=str, default=None, help="Output path (default: <model>.pt2/.onnx)"
+    )
+    export_parser.add_argument(
+        "--format", choices=["pt2", "onnx"], default="pt2", help="Artifact format (default: pt2)"
+    )
+    export_parser.add_argument(
+        "--check-data",
+        type=str,
+        default=None,
+        help="Compare logits of the original and exported models on these images",
+    )
+
+    # Subcommand: quantize
+    quantize_parser = subparsers.add_parser(
+        "quantize", help="Quantize the trained model to int8 for CPU inference"
+    )
+    quantize_parser.add_argument(
+        "--model", type=str, default="model.pth", help="Path to trained model (default: model.pth)"
+    )
+    quantize_parser.add_argument(
+        "--output", type=str, default=None, help="Output path (default: <model>_int8.pth)"
+    )
+    quantize_parser.add_argument(
+        "--mode",
+        choices=["static", "dynamic"],
+        default="static",
+        help="static: convs + fc with calibration, dynamic: fc only (default: static)",
+    )
+    quantize_parser.add_argument(
+        "--calibration-data",
+        type=str,
+        default=None,
+        help="Calibration images (default: data/raw)",
+    )
+    quantize_parser.add_argument(
+        "--calibration-size",
+        type=int,
+        default=512,
+        help="Number of calibration images (default: 512)",
+    )
+    quantize_parser.add_argument(
+        "--test-data",
+        type=str,
+        default=None,
+        help="Labeled images for the float vs int8 comparison (default: data/test)",
+    )
+
+    # Subcommand: bench
+    bench_parser = subparsers.add_parser(
+        "bench", help="Benchmark generation, preprocessing, loading, training and inference"
+    )
+    bench_parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=["generate", "preprocess", "dataset", "train", "inference"],
+        default=["generate", "preprocess", "dataset", "train", "inference"],
+        help="Stages to run (default: all)",
+    )
+    bench_parser.add_argument(
+        "--count", type=int, default=500, help="Images per class (default: 500)"
+    )
+    bench_parser.add_argument(
+        "--workers", type=int, default=1, help="Processes for generate/preprocess (default: 1)"
+    )
+    bench_parser.add_argument(
+        "--seed", type=int, default=0, help="Random seed (default: 0)"
+    )
+    bench_parser.add_argument(
+        "--backend",
+        choices=["pil", "numpy"],
+        default="pil",
+        help="Generation backend (default: pil)",
+    )
+    bench_parser.add_argument(
+        "--train-steps", type=int, default=20, help="Timed training steps (default: 20)"
+    )
+    bench_parser.add_argument(
+        "--train-batch-size", type=int, default=32, help="Training batch size (default: 32)"
+    )
+    bench_parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="+",
+        default=[1, 8, 32, 128, 256],
+        help="Inference batch sizes (default: 1 8 32 128 256)",
+    )
+    bench_parser.add_argument(
+        "--iterations",
+        type=int,
+        default=50,
+        help="Timed forward passes per batch size (default: 50)",
+    )
+    bench_parser.add_argument(
+        "--model",
+        type=str,
+        default=None,
+        help="Model for the inference stage (default: untrained SimpleCNN)",
+    )
+    bench_parser.add_argument(
+        "--output", type=str, default="bench.json", help="JSON report path (default: bench.json)"
+    )
+
+    # Subcommand: sweep
+    sweep_parser = subparsers.add_parser(
+        "sweep", help="Run a parallel hyperparameter sweep (grid or random search)"
+    )
+    sweep_parser.add_argument(
+        "--spec", type=str, required=True, help="JSON sweep spec (method, params, trials, fixed)"
+    )
+    sweep_parser.add_argument(
+        "--data", type=str, default=None, help="Images to train on (default: data/raw)"
+    )
+    sweep_parser.add_argument(
+        "--packed", type=str, default=None, help="Use this packed dataset instead of --data"
+    )
+    sweep_parser.add_argument(
+        "--output", type=str, default="sweeps", help="Output directory (default: sweeps)"
+    )
+    sweep_parser.add_argument(
+        "--parallel", type=int, default=None, help="Concurrent trials (default: fill the cores)"
+    )
+    sweep_parser.add_argument(
+        "--threads-per-trial",
+        type=int,
+        default=None,
+        help="torch threads per trial (default: cores / parallel)",
+    )
+    sweep_parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of every trial (default: 0)"
+    )
 
     args = parser.parse_args()
 
     if args.command == "generate":
+        if args.packed and args.backend == "pil":
+            generate_parser.error("--packed always rasterizes with numpy, --backend pil is not supported")
         print("Starting data generation...")
         try:
-            generate_data.main()
+            from mlsc import generate_data
+
+            if args.packed:
+                generate_data.generate_packed(args.count, args.seed, args.output, args.workers)
+            else:
+                generate_data.generate_dataset(
+                    args.count, args.workers, args.seed, args.output, args.backend or "pil"
+                )
         except Exception as e:
             print(f"Error during data generation: {e}")
             sys.exit(1)
@@ -77,7 +508,37 @@ def main():
     elif args.command == "train":
         print("Starting model training...")
         try:
-            train.train()
+            from mlsc import train
+
+            train.train(
+                packed_dir=args.packed,
+                in_memory=args.in_memory,
+                batch_size=args.batch_size,
+                learning_rate=args.lr,
+                num_epochs=args.epochs,
+                val_batch_size=args.val_batch_size,
+                num_workers=args.num_workers,
+                pin_memory=args.pin_memory,
+                persistent_workers=args.persistent_workers,
+                prefetch_factor=args.prefetch_factor,
+                synthetic=args.synthetic,
+                steps_per_epoch=args.steps_per_epoch,
+                seed=args.seed,
+                optimize=args.optimize,
+                precision=args.precision,
+                profile=args.profile,
+                profile_trace=args.profile_trace,
+                output=args.output,
+                checkpoint=args.checkpoint,
+                checkpoint_every=args.checkpoint_every,
+                resume=args.resume,
+                patience=args.patience,
+                distributed=args.distributed,
+                dist_backend=args.dist_backend,
+                cache=not args.no_cache,
+                cache_dir=args.cache_dir,
+                cache_size_mb=args.cache_size,
+            )
         except Exception as e:
             print(f"Error during training: {e}")
             sys.exit(1)
@@ -85,6 +546,8 @@ def main():
     elif args.command == "organize-test":
         print("Organizing test data...")
         try:
+            from mlsc import organize_test_data
+
             organize_test_data.organize_test_data(args.source, args.dest)
         except Exception as e:
             print(f"Error organizing test data: {e}")
@@ -93,19 +556,134 @@ def main():
     elif args.command == "preprocess":
         print("Preprocessing images...")
         try:
-            preprocess.preprocess_images(args.input, args.output)
+            from mlsc import preprocess
+
+            preprocess.preprocess_images(
+                args.input, args.output, args.workers, args.incremental
+            )
         except Exception as e:
             print(f"Error preprocessing images: {e}")
             sys.exit(1)
 
+    elif args.command == "pack":
+        print("Packing dataset...")
+        try:
+            from mlsc import pack
+
+            pack.pack_dataset(args.input, args.output)
+        except Exception as e:
+            print(f"Error packing dataset: {e}")
+            sys.exit(1)
+
     elif args.command == "predict":
         print("Running predictions...")
         try:
-            predict.predict_images(args.model, args.data, args.output)
+            from mlsc import predict
+
+            predict.predict_images(
+                args.model,
+                args.data,
+                args.output,
+                args.batch_size,
+                args.workers,
+                args.prefetch,
+                args.backend,
+                args.optimize,
+                args.precision,
+                not args.no_cache,
+                args.cache_dir,
+                args.cache_size,
+                args.prediction_cache,
+                args.rescore,
+            )
         except Exception as e:
             print(f"Error during prediction: {e}")
             sys.exit(1)
 
+    elif args.command == "serve":
+        print("Starting inference server...")
+        try:
+            from mlsc import serve
+
+            serve.serve(
+                args.model,
+                args.host,
+                args.port,
+                args.max_batch_size,
+                args.max_wait_ms,
+                args.backend,
+            )
+        except Exception as e:
+            print(f"Error starting server: {e}")
+            sys.exit(1)
+
+    elif args.command == "export":
+        print("Exporting model...")
+        try:
+            from mlsc import export
+
+            export.export_model(args.model, args.output, args.format, args.check_data)
+        except Exception as e:
+            print(f"Error exporting model: {e}")
+            sys.exit(1)
+
+    elif args.command == "quantize":
+        print("Quantizing model...")
+        try:
+            from mlsc import quantize
+
+            quantize.quantize_model(
+                args.model,
+                args.output,
+                args.mode,
+                args.calibration_data,
+                args.calibration_size,
+                args.test_data,
+            )
+        except Exception as e:
+            print(f"Error quantizing model: {e}")
+            sys.exit(1)
+
+    elif args.command == "bench":
+        print("Running benchmarks...")
+        try:
+            from mlsc import bench
+
+            bench.run_benchmarks(
+                args.stages,
+                args.count,
+                args.workers,
+                args.seed,
+                args.backend,
+                args.train_steps,
+                args.train_batch_size,
+                args.batch_sizes,
+                args.iterations,
+                args.model,
+                args.output,
+            )
+        except Exception as e:
+            print(f"Error running benchmarks: {e}")
+            sys.exit(1)
+
+    elif args.command == "sweep":
+        print("Running hyperparameter sweep...")
+        try:
+            from mlsc import sweep
+
+            sweep.run_sweep(
+                args.spec,
+                args.data,
+                args.packed,
+                args.output,
+                args.parallel,
+                args.threads_per_trial,
+                args.seed,
+            )
+        except Exception as e:
+            print(f"Error running sweep: {e}")
+            sys.exit(1)
+
     else:
         parser.print_help()
         sys.exit(1)
@@ -2,25 +2,44 @@
 dataset.py
 Author: Lennin Abrão Sousa Santos
 Data criação: 2026-01-29
-Date update: 2026-01-29
-Explicação: PyTorch Dataset class for loading the shapes images.
+Date update: 2026-10-17
+Explicação: PyTorch Dataset classes for loading the shapes images.
 How to use: Used internally by train.py
 Licença: AGPL3
 """
 
-from torch.utils.data import Dataset
+import math
+import numpy as np
+import torch
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
 from PIL import Image
 from pathlib import Path
 import torchvision.transforms as T
+from mlsc.pack import default_packed_dir, load_packed
+from mlsc.generate_data import rasterize_circles, rasterize_squares
+
+# Distinguishes stream RNGs from the per-shard RNGs of generate_data
+STREAM_SEED_TAG = 0x5354524D
+
+
+def to_normalized_tensor(images):
+    """
+    Converts uint8 images (N, 64, 64) to float (N, 1, 64, 64), normalized
+    like ToTensor + Normalize((0.5,), (0.5,)).
+    """
+    images = torch.from_numpy(np.asarray(images)).unsqueeze(1)
+    return images.float().div_(255).sub_(0.5).div_(0.5)
 
 
 class ShapesDataset(Dataset):
-    def __init__(self, root_dir=None, transform=None):
+    def __init__(self, root_dir=None, transform=None, cache=None):
         """
         Args:
             root_dir (string): Directory with all the images.
             transform (callable, optional): Optional transform to be applied
                 on a sample.
+            cache (TensorCache, optional): Read the normalized images from
+                this cache instead of decoding them (default transform only).
         """
         if root_dir is None:
             # Assume ../data/raw relative to this file
@@ -29,6 +48,7 @@ class ShapesDataset(Dataset):
             root_dir = Path(root_dir)
 
         self.root_dir = root_dir
+        self.cache = cache if transform is None else None
 
         if transform is None:
             # Default transform if not provided: ToTensor and Normalize for grayscale
@@ -58,6 +78,10 @@ class ShapesDataset(Dataset):
 
     def __getitem__(self, idx):
         img_path = self.image_paths[idx]
+        if self.cache is not None:
+            image = torch.from_numpy(self.cache.load(img_path)).unsqueeze(0)
+            return image, self.labels[idx]
+
         # Open image and convert to grayscale ('L') just in case
         image = Image.open(img_path).convert("L")
         label = self.labels[idx]
@@ -66,3 +90,134 @@ class ShapesDataset(Dataset):
             image = self.transform(image)
 
         return image, label
+
+
+class PackedShapesDataset(Dataset):
+    def __init__(self, packed_dir=None):
+        """
+        Dataset over the arrays written by `mlsc pack`.
+
+        The images file is memory-mapped, so samples are slices of the page
+        cache: no file opens or PNG decoding happen after the first access.
+
+        Args:
+            packed_dir (string): Directory with images.npy and labels.npy
+                (default: data/packed).
+        """
+        if packed_dir is None:
+            packed_dir = default_packed_dir()
+
+        self.packed_dir = Path(packed_dir)
+        self.images, self.labels = load_packed(self.packed_dir)
+
+    def __getstate__(self):
+        # DataLoader workers re-map the file instead of pickling its contents
+        state = self.__dict__.copy()
+        state["images"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.images, _ = load_packed(self.packed_dir)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        # Zero-copy view of the mapped uint8 pixels, normalized like ToTensor + Normalize
+        image = torch.from_numpy(self.images[idx]).unsqueeze(0)
+        image = image.float().div_(255).sub_(0.5).div_(0.5)
+        return image, int(self.labels[idx])
+
+
+def load_tensors(dataset):
+    """
+    Materializes a whole dataset as two tensors, decoding every sample once.
+
+    Args:
+        dataset: ShapesDataset or PackedShapesDataset
+
+    Returns:
+        Tuple (images, labels): float (N, 1, 64, 64) normalized, int64 (N,)
+    """
+    if isinstance(dataset, PackedShapesDataset):
+        images = to_normalized_tensor(np.array(dataset.images))
+        labels = torch.from_numpy(np.array(dataset.labels, dtype=np.int64))
+        return images, labels
+
+    images = torch.empty((len(dataset), 1, 64, 64))
+    labels = torch.empty(len(dataset), dtype=torch.long)
+    for i in range(len(dataset)):
+        images[i], labels[i] = dataset[i]
+    return images, labels
+
+
+class TensorBatchLoader:
+    def __init__(self, images, labels, batch_size, shuffle=False):
+        """
+        Iterates (images, labels) batches by slicing tensors that already
+        hold the whole dataset, skipping per-sample __getitem__ and collate.
+
+        Args:
+            images (Tensor): All samples, on the device used for training.
+            labels (Tensor): All labels, on the same device.
+            batch_size (int): Samples per batch.
+            shuffle (bool): Draw a new random permutation every epoch.
+        """
+        self.images = images
+        self.labels = labels
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __len__(self):
+        return math.ceil(len(self.labels) / self.batch_size)
+
+    def __iter__(self):
+        n = len(self.labels)
+        if self.shuffle:
+            order = torch.randperm(n, device=self.labels.device)
+            for start in range(0, n, self.batch_size):
+                idx = order[start:start + self.batch_size]
+                yield self.images[idx], self.labels[idx]
+        else:
+            for start in range(0, n, self.batch_size):
+                yield (
+                    self.images[start:start + self.batch_size],
+                    self.labels[start:start + self.batch_size],
+                )
+
+
+class SyntheticShapesDataset(IterableDataset):
+    def __init__(self, batch_size=32, seed=0, size=64, rank=0):
+        """
+        Never-ending stream of freshly rasterized (images, labels) batches.
+
+        Use with DataLoader(batch_size=None). Each DataLoader worker draws
+        from its own RNG seeded with (seed, rank, worker id), so workers and
+        distributed ranks never produce the same samples and nothing is read
+        from disk.
+
+        Args:
+            batch_size (int): Samples per yielded batch.
+            seed (int): Base seed of the stream.
+            size (int): Image side in pixels.
+            rank (int): Distributed rank of the process.
+        """
+        self.batch_size = batch_size
+        self.seed = seed
+        self.size = size
+        self.rank = rank
+
+    def __iter__(self):
+        worker_info = get_worker_info()
+        worker_id = worker_info.id if worker_info is not None else 0
+        rng = np.random.default_rng([self.seed, STREAM_SEED_TAG, self.rank, worker_id])
+
+        images = np.empty((self.batch_size, self.size, self.size), dtype=np.uint8)
+        while True:
+            labels = rng.integers(0, 2, self.batch_size)
+            is_square = labels == 1
+            n_squares = int(is_square.sum())
+            images[~is_square] = rasterize_circles(self.batch_size - n_squares, self.size, rng)
+            images[is_square] = rasterize_squares(n_squares, self.size, rng)
+            yield to_normalized_tensor(images), torch.from_numpy(labels)
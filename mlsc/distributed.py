@@ -0,0 +1,54 @@
+"""
+distributed.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Helpers for distributed data-parallel (DDP) training launched with torchrun.
+How to use: uv run torchrun --nproc-per-node 4 -m mlsc.cli train --distributed
+Licença: AGPL3
+"""
+
+import os
+
+import torch
+import torch.distributed as dist
+
+
+def setup(backend="gloo"):
+    """
+    Joins the process group described by the environment torchrun sets
+    (RANK, WORLD_SIZE, MASTER_ADDR, ...). gloo runs on CPUs, over one or many
+    hosts; nccl puts each process on the GPU of its LOCAL_RANK.
+
+    Returns:
+        Tuple (rank, world_size, device)
+    """
+    if "RANK" not in os.environ:
+        raise ValueError("Distributed training must be launched with torchrun")
+
+    dist.init_process_group(backend)
+    if backend == "nccl":
+        device = torch.device("cuda", int(os.environ["LOCAL_RANK"]))
+        torch.cuda.set_device(device)
+    else:
+        device = torch.device("cpu")
+    return dist.get_rank(), dist.get_world_size(), device
+
+
+def cleanup():
+    if dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def broadcast_object(obj):
+    """Value of `obj` on rank 0, on every rank (e.g. a randomly drawn seed)."""
+    objects = [obj]
+    dist.broadcast_object_list(objects, src=0)
+    return objects[0]
+
+
+def all_reduce_sum(device, *values):
+    """Sums each of `values` (numbers) over all ranks."""
+    totals = torch.tensor(values, dtype=torch.float64, device=device)
+    dist.all_reduce(totals)
+    return totals.tolist()
@@ -0,0 +1,175 @@
+"""
+export.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Exports the trained model as a torch.export (.pt2) or ONNX (.onnx) artifact.
+How to use: uv run mlsc export --model <model_path> [--format pt2|onnx] [--check-data data/test]
+Licença: AGPL3
+"""
+
+import argparse
+from pathlib import Path
+
+import torch
+
+from mlsc.predict import collect_images, iter_batches, load_model
+
+FORMATS = ("pt2", "onnx")
+
+
+def check_parity(reference_path, artifact_path, data_dir, batch_size=256, tolerance=1e-3):
+    """
+    Compares the logits of the original model and of an exported artifact on
+    every image under data_dir/circle and data_dir/square.
+
+    Args:
+        reference_path: Original .pth state_dict
+        artifact_path: Exported .pt2 or .onnx file (run with its own backend)
+        data_dir: Test images (resized/grayscaled on the fly when needed)
+        batch_size: Images per forward pass
+        tolerance: Largest accepted absolute logit difference
+
+    Returns:
+        Dictionary with max_abs_diff, agreement (%) and total
+    """
+    cpu = torch.device("cpu")
+    reference = load_model(reference_path, cpu, "torch")
+    # Never "auto": without onnxruntime it would fall back to the .pth/.pt2
+    # next to the artifact and compare the reference against itself
+    backend = "onnx" if Path(artifact_path).suffix == ".onnx" else "torch"
+    artifact = load_model(artifact_path, cpu, backend)
+
+    paths, _ = collect_images(data_dir)
+    if not paths:
+        raise ValueError(f"No images found in {data_dir}!")
+
+    max_diff = 0.0
+    agree = 0
+    with torch.inference_mode():
+        for _, images in iter_batches(paths, batch_size):
+            expected = reference(images)
+            actual = artifact(images)
+            max_diff = max(max_diff, (expected - actual).abs().max().item())
+            agree += (expected.argmax(dim=1) == actual.argmax(dim=1)).sum().item()
+
+    agreement = 100 * agree / len(paths)
+    print(f"Parity on {len(paths)} images from {data_dir}:")
+    print(f"  max |logit diff| = {max_diff:.2e}, same prediction on {agreement:.2f}%")
+    if max_diff > tolerance:
+        raise RuntimeError(f"Exported model differs from {reference_path} (max diff {max_diff:.2e})")
+
+    return {"max_abs_diff": max_diff, "agreement": agreement, "total": len(paths)}
+
+
+def export_model(model_path="model.pth", output_path=None, format="pt2", check_data=None):
+    """
+    Exports SimpleCNN with a dynamic batch dimension.
+
+    "pt2" writes a torch.export artifact, which predict/serve load without
+    building SimpleCNN in Python. "onnx" writes a single-file ONNX model for
+    ONNX Runtime (needs the `onnx` extra: onnx, onnxscript, onnxruntime).
+
+    Args:
+        model_path: Path to saved model (.pth file)
+        output_path: Where to write the artifact (default: model_path with .pt2/.onnx)
+        format: "pt2" or "onnx"
+        check_data: Optional image directory for a logits parity check
+            between the original model and the exported one
+
+    Returns:
+        Path of the written artifact
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}, expected one of {FORMATS}")
+
+    model_path = Path(model_path)
+    if not model_path.exists():
+        raise ValueError(f"Model file {model_path} does not exist!")
+
+    if output_path is None:
+        output_path = model_path.with_suffix(f".{format}")
+    else:
+        output_path = Path(output_path)
+
+    model = load_model(model_path, torch.device("cpu"), "torch")
+
+    batch = torch.export.Dim("batch", min=1)
+    example = torch.zeros((2, 1, 64, 64))
+    dynamic_shapes = {"x": {0: batch}}
+
+    if format == "onnx":
+        torch.onnx.export(
+            model,
+            (example,),
+            output_path,
+            input_names=["x"],
+            output_names=["logits"],
+            dynamic_shapes=dynamic_shapes,
+            dynamo=True,
+            external_data=False,
+            verbose=False,
+        )
+    else:
+        exported = torch.export.export(model, (example,), dynamic_shapes=dynamic_shapes)
+
+        # Sanity check: the exported graph must reproduce the eager logits
+        check = torch.randn((3, 1, 64, 64))
+        with torch.inference_mode():
+            max_diff = (exported.module()(check) - model(check)).abs().max().item()
+        if max_diff > 1e-4:
+            raise RuntimeError(f"Exported model differs from eager model (max diff {max_diff:.2e})")
+
+        torch.export.save(exported, output_path)
+
+    print(f"✓ Exported {model_path} to {output_path}")
+
+    if check_data is not None:
+        check_parity(model_path, output_path, check_data)
+
+    return output_path
+
+
+def main():
+    """CLI entry point for export command."""
+    parser = argparse.ArgumentParser(
+        description="Export the trained model as a torch.export or ONNX artifact"
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default="model.pth",
+        help="Path to trained model file (default: model.pth)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Output path (default: same as --model with .pt2/.onnx extension)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="pt2",
+        help="Artifact format (default: pt2)"
+    )
+    parser.add_argument(
+        "--check-data",
+        type=str,
+        default=None,
+        help="Compare logits of the original and exported models on these images (e.g. data/test)"
+    )
+
+    args = parser.parse_args()
+
+    try:
+        export_model(args.model, args.output, args.format, args.check_data)
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -2,33 +2,40 @@
 generate_data.py
 Author: Lennin Abrão Sousa Santos
 Data criação: 2026-01-29
-Date update: 2026-01-29
+Date update: 2026-10-17
 Explicação: Generates synthetic dataset of squares and circles.
-How to use: uv run mlsc generate
+How to use: uv run mlsc generate [--count N] [--workers K] [--seed S] [--backend numpy] [--packed]
 Licença: AGPL3
 """
 
 from PIL import Image, ImageDraw
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import numpy as np
 import os
 import random
 from pathlib import Path
 
+# Samples per shard. Shards are the unit of work and of seeding, so the
+# output only depends on the seed, never on the number of workers.
+SHARD_SIZE = 250
+
 
 def create_directory(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
 
-def generate_square(size=64):
+def generate_square(size=64, rng=random):
     img = Image.new("L", (size, size), 0)
     draw = ImageDraw.Draw(img)
 
     # Random size for square
-    square_size = random.randint(10, 40)
+    square_size = rng.randint(10, 40)
 
     # Random position
-    x0 = random.randint(0, size - square_size)
-    y0 = random.randint(0, size - square_size)
+    x0 = rng.randint(0, size - square_size)
+    y0 = rng.randint(0, size - square_size)
     x1 = x0 + square_size
     y1 = y0 + square_size
 
@@ -36,16 +43,16 @@ def generate_square(size=64):
     return img
 
 
-def generate_circle(size=64):
+def generate_circle(size=64, rng=random):
     img = Image.new("L", (size, size), 0)
     draw = ImageDraw.Draw(img)
 
     # Random radius
-    radius = random.randint(5, 20)
+    radius = rng.randint(5, 20)
 
     # Random position (ensure circle fits)
-    x_center = random.randint(radius, size - radius)
-    y_center = random.randint(radius, size - radius)
+    x_center = rng.randint(radius, size - radius)
+    y_center = rng.randint(radius, size - radius)
 
     draw.ellipse(
         [x_center - radius, y_center - radius, x_center + radius, y_center + radius],
@@ -54,29 +61,281 @@ def generate_circle(size=64):
     return img
 
 
-def main():
-    # Define paths relative to this script
-    current_dir = Path(__file__).parent
-    raw_data_dir = current_dir.parent / "data" / "raw"
+def rasterize_squares(n, size=64, rng=None):
+    """
+    Vectorized generate_square: draws n squares at once with NumPy.
+
+    Same parameter distribution as generate_square; pixels match
+    ImageDraw.rectangle exactly (both corners inclusive).
+
+    Returns:
+        uint8 array (n, size, size) with 0 background and 255 shapes
+    """
+    rng = np.random.default_rng(rng)
+    side = rng.integers(10, 41, n)
+    x0 = rng.integers(0, size - side + 1)
+    y0 = rng.integers(0, size - side + 1)
+
+    coords = np.arange(size)
+    inside_x = (coords >= x0[:, None]) & (coords <= (x0 + side)[:, None])
+    inside_y = (coords >= y0[:, None]) & (coords <= (y0 + side)[:, None])
+    # Outer product of the row/column masks, scaled to 255 in uint8
+    rows = inside_y.view(np.uint8)
+    cols = inside_x.view(np.uint8) * np.uint8(255)
+    return rows[:, :, None] * cols[:, None, :]
+
+
+def rasterize_circles(n, size=64, rng=None):
+    """
+    Vectorized generate_circle: draws n circles at once with NumPy.
+
+    Same parameter distribution as generate_circle. A pixel is filled when
+    its distance to the center is within radius + 0.4, which reproduces
+    ImageDraw.ellipse up to a few boundary pixels.
+
+    Returns:
+        uint8 array (n, size, size) with 0 background and 255 shapes
+    """
+    rng = np.random.default_rng(rng)
+    radius = rng.integers(5, 21, n)
+    x_center = rng.integers(radius, size - radius + 1)
+    y_center = rng.integers(radius, size - radius + 1)
+
+    coords = np.arange(size)
+    # Distances are integers, so compare against floor((r + 0.4)^2) in int16
+    # and fold the threshold into the row term: one full-size op per batch
+    threshold = np.floor((radius + 0.4) ** 2)
+    dx2 = ((coords - x_center[:, None]) ** 2).astype(np.int16)
+    row_budget = (threshold[:, None] - (coords - y_center[:, None]) ** 2).astype(np.int16)
+    mask = dx2[:, None, :] <= row_budget[:, :, None]
+    images = mask.view(np.uint8)
+    images *= 255
+    return images
+
+
+GENERATORS = {"square": generate_square, "circle": generate_circle}
+RASTERIZERS = {"square": rasterize_squares, "circle": rasterize_circles}
+LABELS = {"circle": 0, "square": 1}
+
+
+def shard_rng(seed, shape, shard):
+    """NumPy generator for one shard, independent of the process running it."""
+    return np.random.default_rng([seed, LABELS[shape], shard])
+
+
+def generate_shard(shape, output_dir, start, stop, seed, backend="pil"):
+    """
+    Draws and saves samples start..stop-1 of one shape.
+
+    The RNG is derived from (seed, shape, shard index), so every shard is
+    reproducible on its own, in any process.
+    """
+    shard = start // SHARD_SIZE
+    if backend == "numpy":
+        images = RASTERIZERS[shape](stop - start, rng=shard_rng(seed, shape, shard))
+        for i, pixels in zip(range(start, stop), images):
+            Image.fromarray(pixels).save(Path(output_dir) / f"{shape}_{i}.png")
+        return stop - start
+
+    rng = random.Random(f"{seed}:{shape}:{shard}")
+    generator = GENERATORS[shape]
+    for i in range(start, stop):
+        generator(rng=rng).save(Path(output_dir) / f"{shape}_{i}.png")
+    return stop - start
+
+
+def generate_arrays(count, seed=None, size=64):
+    """
+    Generates `count` circles and `count` squares in memory, without PNGs.
+
+    Returns:
+        Tuple (images, labels): uint8 (2*count, size, size), int64 (2*count,),
+        circles first, like `mlsc pack`
+    """
+    if seed is None:
+        seed = random.randrange(2**32)
+
+    images = np.empty((2 * count, size, size), dtype=np.uint8)
+    labels = np.empty(2 * count, dtype=np.int64)
+    fill_arrays(images, labels, count, seed, size)
+    return images, labels
+
+
+def fill_arrays(images, labels, count, seed, size=64):
+    """Fills preallocated (memmap or in-memory) arrays shard by shard."""
+    for shape in ("circle", "square"):
+        offset = LABELS[shape] * count
+        for start in range(0, count, SHARD_SIZE):
+            stop = min(start + SHARD_SIZE, count)
+            rng = shard_rng(seed, shape, start // SHARD_SIZE)
+            images[offset + start:offset + stop] = RASTERIZERS[shape](stop - start, size, rng)
+            labels[offset + start:offset + stop] = LABELS[shape]
+
+
+def fill_packed_shard(output_dir, shape, count, start, stop, seed):
+    """
+    Rasterizes samples start..stop-1 of one shape into an existing packed
+    dataset, at the rows fill_arrays would write them to.
+    """
+    from mlsc.pack import IMAGES_FILE, LABELS_FILE
+
+    images = np.load(Path(output_dir) / IMAGES_FILE, mmap_mode="r+")
+    labels = np.load(Path(output_dir) / LABELS_FILE, mmap_mode="r+")
+    offset = LABELS[shape] * count
+    rng = shard_rng(seed, shape, start // SHARD_SIZE)
+    images[offset + start:offset + stop] = RASTERIZERS[shape](stop - start, rng=rng)
+    labels[offset + start:offset + stop] = LABELS[shape]
+    images.flush()
+    labels.flush()
+    return stop - start
 
-    square_dir = raw_data_dir / "square"
-    circle_dir = raw_data_dir / "circle"
 
-    create_directory(square_dir)
-    create_directory(circle_dir)
+def generate_packed(count=1000, seed=None, output_dir=None, workers=1):
+    """
+    Rasterizes the dataset with NumPy straight into the `mlsc pack` format.
 
-    print("Generating squares...")
-    for i in range(1000):
-        img = generate_square()
-        img.save(square_dir / f"square_{i}.png")
+    Args:
+        count: Number of images per class
+        seed: Base seed; the same seed gives identical arrays for any number
+            of workers (default: random, printed for reuse)
+        output_dir: Packed dataset directory (default: data/packed)
+        workers: Processes rasterizing shards in parallel (1 runs inline)
+    """
+    from mlsc.pack import default_packed_dir, open_packed
 
-    print("Generating circles...")
-    for i in range(1000):
-        img = generate_circle()
-        img.save(circle_dir / f"circle_{i}.png")
+    if count < 0:
+        raise ValueError(f"Count must be >= 0, got {count}")
+
+    if workers < 1:
+        raise ValueError(f"Number of workers must be positive, got {workers}")
+
+    if output_dir is None:
+        output_dir = default_packed_dir()
+
+    if seed is None:
+        seed = random.randrange(2**32)
+    print(f"Using seed: {seed}")
+
+    print(f"Rasterizing {count} squares and {count} circles into {output_dir} with {workers} worker(s)...")
+    images, labels = open_packed(output_dir, 2 * count)
+    if workers == 1:
+        fill_arrays(images, labels, count, seed)
+        images.flush()
+        labels.flush()
+    else:
+        # Workers map the files themselves and write disjoint rows
+        del images, labels
+        shards = [
+            (output_dir, shape, count, start, min(start + SHARD_SIZE, count), seed)
+            for shape in ("circle", "square")
+            for start in range(0, count, SHARD_SIZE)
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Consume results so worker exceptions are raised here
+            list(pool.map(fill_packed_shard, *zip(*shards)))
+
+    print(f"Data generation complete. Saved to {output_dir}")
+
+
+def generate_dataset(count=1000, workers=1, seed=None, output_dir=None, backend="pil"):
+    """
+    Generates `count` squares and `count` circles as PNGs.
+
+    Args:
+        count: Number of images per class
+        workers: Processes drawing shards in parallel (1 runs inline)
+        seed: Base seed; the same seed gives byte-identical files for any
+            number of workers (default: random, printed for reuse)
+        output_dir: Where circle/ and square/ are written (default: data/raw)
+        backend: "pil" draws each image with ImageDraw, "numpy" rasterizes
+            whole shards at once
+    """
+    if backend not in ("pil", "numpy"):
+        raise ValueError(f"Unknown backend {backend!r}, expected 'pil' or 'numpy'")
+
+    if count < 0:
+        raise ValueError(f"Count must be >= 0, got {count}")
+
+    if workers < 1:
+        raise ValueError(f"Number of workers must be positive, got {workers}")
+
+    # Define paths relative to this script
+    if output_dir is None:
+        current_dir = Path(__file__).parent
+        raw_data_dir = current_dir.parent / "data" / "raw"
+    else:
+        raw_data_dir = Path(output_dir)
+
+    if seed is None:
+        seed = random.randrange(2**32)
+    print(f"Using seed: {seed}")
+
+    shards = []
+    for shape in ("square", "circle"):
+        create_directory(raw_data_dir / shape)
+        for start in range(0, count, SHARD_SIZE):
+            stop = min(start + SHARD_SIZE, count)
+            shards.append((shape, raw_data_dir / shape, start, stop, seed, backend))
+
+    print(f"Generating {count} squares and {count} circles with {workers} worker(s)...")
+    if workers == 1:
+        for shard in shards:
+            generate_shard(*shard)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Consume results so worker exceptions are raised here
+            list(pool.map(generate_shard, *zip(*shards)))
 
     print(f"Data generation complete. Saved to {raw_data_dir}")
 
 
+def main():
+    """CLI entry point for generate command."""
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic square and circle images"
+    )
+    parser.add_argument(
+        "--count", type=int, default=1000, help="Images per class (default: 1000)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Parallel processes (default: 1)"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Base random seed (default: random)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Output directory (default: data/raw, or data/packed with --packed)"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["pil", "numpy"],
+        default=None,
+        help="pil: ImageDraw per image, numpy: vectorized batches (default: pil, numpy with --packed)"
+    )
+    parser.add_argument(
+        "--packed",
+        action="store_true",
+        help="Write a packed dataset (mlsc pack format) instead of PNGs, using the numpy backend"
+    )
+
+    args = parser.parse_args()
+    if args.packed and args.backend == "pil":
+        parser.error("--packed always rasterizes with numpy, --backend pil is not supported")
+
+    try:
+        if args.packed:
+            generate_packed(args.count, args.seed, args.output, args.workers)
+        else:
+            generate_dataset(args.count, args.workers, args.seed, args.output, args.backend or "pil")
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+
 if __name__ == "__main__":
-    main()
+    exit(main())
@@ -0,0 +1,105 @@
+"""
+optimize.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Opt-in fast execution paths (channels-last, torch.compile, mixed precision) for training and inference.
+How to use: uv run mlsc train --optimize --precision bf16 / uv run mlsc predict --optimize --precision bf16 ...
+Licença: AGPL3
+"""
+
+from contextlib import nullcontext
+
+import torch
+import torch.nn as nn
+
+PRECISIONS = ("fp32", "bf16", "fp16")
+
+
+class OptimizedModel:
+    def __init__(self, model, compile=True):
+        """
+        Runs `model` with channels-last weights and inputs, compiled with
+        torch.compile when possible. Inductor fuses each conv with its ReLU
+        and max-pool, so SimpleCNN runs as a few fused kernels instead of one
+        kernel per op.
+
+        If torch.compile is unavailable or fails to compile (e.g. no C++
+        compiler), the first call prints why and every call falls back to
+        eager mode. Errors of the model itself (shape mismatches, OOM, bad
+        dtypes) are raised as usual.
+
+        Parameters are shared with `model`: optimize it, toggle train()/eval()
+        and save its state_dict as usual.
+
+        Args:
+            model (nn.Module): Model to run; moved to channels-last in place.
+            compile (bool): Also apply torch.compile.
+        """
+        self.model = model.to(memory_format=torch.channels_last)
+        self.compiled = None
+        if compile:
+            try:
+                self.compiled = torch.compile(model)
+            except Exception as e:
+                print(f"torch.compile unavailable ({e}), using eager channels-last")
+
+    def __call__(self, images):
+        images = images.contiguous(memory_format=torch.channels_last)
+        if self.compiled is not None:
+            try:
+                return self.compiled(images)
+            except Exception as e:
+                if not is_compile_error(e):
+                    raise
+                print(f"torch.compile failed ({type(e).__name__}: {e}), falling back to eager")
+                self.compiled = None
+        return self.model(images)
+
+
+def is_compile_error(e):
+    """
+    True for failures of Dynamo or Inductor themselves. Dynamo reports errors
+    raised by the traced model as TorchRuntimeError, which are not.
+    """
+    from torch._dynamo.exc import TorchDynamoException, TorchRuntimeError
+    from torch._inductor.exc import InductorError
+
+    if isinstance(e, TorchRuntimeError):
+        return False
+    return isinstance(e, (TorchDynamoException, InductorError))
+
+
+def optimize_model(model, compile=True):
+    """
+    Wraps a torch model with OptimizedModel; other backends (ONNX Runtime,
+    int8) are returned unchanged since they run their own kernels.
+    """
+    if not isinstance(model, nn.Module):
+        print("Optimized mode only applies to torch models, ignoring it")
+        return model
+    return OptimizedModel(model, compile)
+
+
+def autocast(device, precision="fp32"):
+    """
+    Autocast context running matmuls and convolutions in reduced precision
+    (weights stay float32). bf16 keeps the float32 exponent range, so it needs
+    no loss scaling and runs on CPUs with AVX512-BF16/AMX; fp16 is CUDA only.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    if precision == "fp32":
+        return nullcontext()
+    if precision == "fp16" and device.type != "cuda":
+        raise ValueError(f"fp16 autocast needs CUDA (device: {device}), use bf16 instead")
+    dtype = torch.bfloat16 if precision == "bf16" else torch.float16
+    return torch.autocast(device.type, dtype=dtype)
+
+
+def grad_scaler(device, precision="fp32"):
+    """
+    Loss scaler for training; only enabled for fp16, whose narrow exponent
+    range lets small gradients underflow. Disabled, it passes values through.
+    """
+    return torch.amp.GradScaler(device.type, enabled=precision == "fp16")
@@ -0,0 +1,143 @@
+"""
+pack.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Packs the PNG dataset into contiguous uint8 arrays for memory-mapped loading.
+How to use: uv run mlsc pack --input <raw_dir> --output <packed_dir>
+Licença: AGPL3
+"""
+
+from pathlib import Path
+from PIL import Image
+import numpy as np
+import argparse
+
+IMAGES_FILE = "images.npy"
+LABELS_FILE = "labels.npy"
+CLASS_NAMES = ["circle", "square"]
+
+
+def default_packed_dir():
+    return Path(__file__).parent.parent / "data" / "packed"
+
+
+def open_packed(output_dir, count, size=64):
+    """
+    Creates the packed files and returns them as writable memmaps.
+
+    Args:
+        output_dir: Directory where images.npy and labels.npy are written
+        count: Number of samples
+        size: Image side in pixels
+
+    Returns:
+        Tuple (images, labels): uint8 (count, size, size) and int64 (count,)
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    images = np.lib.format.open_memmap(
+        output_dir / IMAGES_FILE, mode="w+", dtype=np.uint8, shape=(count, size, size)
+    )
+    labels = np.lib.format.open_memmap(
+        output_dir / LABELS_FILE, mode="w+", dtype=np.int64, shape=(count,)
+    )
+    return images, labels
+
+
+def load_packed(packed_dir):
+    """
+    Memory-maps a packed dataset without reading it into memory.
+
+    The images are mapped copy-on-write so slices can be wrapped by
+    torch.from_numpy without copying.
+
+    Returns:
+        Tuple (images, labels)
+    """
+    packed_dir = Path(packed_dir)
+    images_path = packed_dir / IMAGES_FILE
+    labels_path = packed_dir / LABELS_FILE
+    if not images_path.exists() or not labels_path.exists():
+        raise ValueError(f"No packed dataset in {packed_dir}! Run mlsc pack first.")
+    images = np.load(images_path, mmap_mode="c")
+    labels = np.load(labels_path)
+    return images, labels
+
+
+def pack_dataset(input_dir=None, output_dir=None):
+    """
+    Decodes every PNG under input_dir/circle and input_dir/square once and
+    writes them into a single packed dataset.
+
+    Args:
+        input_dir: Directory with circle/ and square/ subdirs (default: data/raw)
+        output_dir: Where to write the packed files (default: data/packed)
+    """
+    if input_dir is None:
+        input_dir = Path(__file__).parent.parent / "data" / "raw"
+    else:
+        input_dir = Path(input_dir)
+
+    if output_dir is None:
+        output_dir = default_packed_dir()
+    else:
+        output_dir = Path(output_dir)
+
+    if not input_dir.exists():
+        raise ValueError(f"Input directory {input_dir} does not exist!")
+
+    samples = []
+    for label, class_name in enumerate(CLASS_NAMES):
+        class_dir = input_dir / class_name
+        if class_dir.exists():
+            samples.extend((img_path, label) for img_path in sorted(class_dir.glob("*.png")))
+
+    if not samples:
+        raise ValueError(f"No images found in {input_dir}!")
+
+    print(f"Packing {len(samples)} images from {input_dir} to {output_dir}")
+
+    images, labels = open_packed(output_dir, len(samples))
+    for i, (img_path, label) in enumerate(samples):
+        images[i] = np.asarray(Image.open(img_path).convert("L"))
+        labels[i] = label
+
+    images.flush()
+    labels.flush()
+
+    print(f"✓ Packed {len(samples)} images")
+    print(f"✓ Saved to {output_dir}")
+
+
+def main():
+    """CLI entry point for pack command."""
+    parser = argparse.ArgumentParser(
+        description="Pack PNG images into a memory-mappable uint8 array"
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        default=None,
+        help="Input directory containing circle/ and square/ subdirectories (default: data/raw)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Output directory (default: data/packed)"
+    )
+
+    args = parser.parse_args()
+
+    try:
+        pack_dataset(args.input, args.output)
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -2,7 +2,7 @@
 predict.py
 Author: Lennin Abrão Sousa Santos
 Data criação: 2026-02-02
-Date update: 2026-02-02
+Date update: 2026-10-17
 Explicação: Performs inference on test images using trained model.
 How to use: uv run mlsc predict --model <model_path> --data <data_dir>
 Licença: AGPL3
@@ -12,19 +12,269 @@ import torch
 from pathlib import Path
 import argparse
 from PIL import Image
-import torchvision.transforms as T
-from mlsc.model import SimpleCNN
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from mlsc.preprocess import TRANSFORM_SIGNATURE, file_sha256, normalized_array
 import csv
+import io
+import importlib.util
+import os
+import time
+import warnings
+from contextlib import nullcontext
 
 
-def predict_images(model_path, data_dir, output_csv=None):
+LABEL_NAMES = {0: "circle", 1: "square"}
+
+
+BACKENDS = ("auto", "torch", "onnx")
+
+
+class OnnxModel:
+    def __init__(self, model_path):
+        """
+        Runs a .onnx export with ONNX Runtime behind the same call interface
+        as SimpleCNN: float tensor (N, 1, 64, 64) in, logits tensor (N, 2) out.
+        """
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, images):
+        logits = self.session.run(None, {self.input_name: images.cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+def resolve_backend(model_path, backend="auto"):
+    """
+    Picks the inference backend for model_path.
+
+    "auto" runs .onnx files with ONNX Runtime when it is installed, and
+    otherwise falls back to torch with the .pt2/.pth file next to it;
+    every other model file runs with torch.
+
+    Returns:
+        Tuple (backend, model_path) actually used
+    """
+    model_path = Path(model_path)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+    is_onnx = model_path.suffix == ".onnx"
+    if backend == "auto":
+        if not is_onnx:
+            return "torch", model_path
+        if importlib.util.find_spec("onnxruntime") is not None:
+            return "onnx", model_path
+        for suffix in (".pt2", ".pth"):
+            fallback = model_path.with_suffix(suffix)
+            if fallback.exists():
+                print(f"onnxruntime not installed, falling back to torch with {fallback}")
+                return "torch", fallback
+        raise ValueError(f"onnxruntime is not installed and no .pt2/.pth found next to {model_path}")
+
+    if backend == "onnx" and not is_onnx:
+        raise ValueError(f"The onnx backend needs a .onnx model (mlsc export --format onnx), got {model_path}")
+    if backend == "onnx" and importlib.util.find_spec("onnxruntime") is None:
+        raise ValueError(f"The onnx backend needs onnxruntime (the `onnx` extra) to run {model_path}")
+    if backend == "torch" and is_onnx:
+        raise ValueError(f"The torch backend cannot run {model_path}, use a .pth or .pt2 model")
+    return backend, model_path
+
+
+def load_model(model_path, device, backend="auto"):
+    """
+    Loads the trained model from model_path.
+
+    A .pt2 file (from `mlsc export`) is loaded as an exported graph, without
+    importing mlsc.model; a .onnx file runs with ONNX Runtime (see
+    resolve_backend); anything else is a SimpleCNN state_dict, float or
+    int8 (from `mlsc quantize`).
+
+    Args:
+        model_path: Path to saved model (.pth state_dict, .pt2 or .onnx export)
+        device: torch.device where the model will run (ONNX Runtime uses the CPU)
+        backend: "auto", "torch" or "onnx"
+
+    Returns:
+        Callable model ready for inference
+    """
+    backend, model_path = resolve_backend(model_path, backend)
+
+    if backend == "onnx":
+        return OnnxModel(model_path)
+
+    if model_path.suffix == ".pt2":
+        # Exported graphs are already in inference form (eval() is not supported)
+        return torch.export.load(model_path).module().to(device)
+
+    with warnings.catch_warnings():
+        # Deserializing the int8 tensors of `mlsc quantize` models goes through
+        # deprecated storage/quantized-tensor APIs, which warn on every load
+        warnings.filterwarnings("ignore", message=".*TypedStorage is deprecated.*")
+        warnings.filterwarnings("ignore", message=".*quantized tensor creation functions.*")
+        checkpoint = torch.load(model_path, map_location="cpu", weights_only=True)
+    if "quantization" in checkpoint:
+        # Saved by `mlsc quantize`; int8 kernels run on the CPU
+        from mlsc.quantize import load_quantized
+
+        return load_quantized(checkpoint)
+
+    from mlsc.model import SimpleCNN
+
+    model = SimpleCNN().to(device)
+    model.load_state_dict(checkpoint)
+    model.eval()
+    return model
+
+
+def collect_images(data_dir):
+    """
+    Lists the images under data_dir/circle and data_dir/square.
+
+    Args:
+        data_dir: Path to directory with circle/ and square/ subdirs
+
+    Returns:
+        Tuple (paths, labels), circles first, each class sorted by filename
+    """
+    paths = []
+    labels = []
+    for label, class_name in LABEL_NAMES.items():
+        class_dir = Path(data_dir) / class_name
+        if class_dir.exists():
+            class_paths = sorted(class_dir.glob("*.png"))
+            paths.extend(class_paths)
+            labels.extend([label] * len(class_paths))
+    return paths, labels
+
+
+def load_batch(paths, out, cache=None, hashes=None):
+    """
+    Decodes and normalizes images straight into a preallocated float tensor.
+
+    Equivalent to ToTensor + Normalize((0.5,), (0.5,)) applied per image.
+    Images that are not 64x64 grayscale go through preprocess.transform first,
+    so raw photos can be scored without a separate preprocess step.
+
+    Args:
+        paths: Image paths
+        out: Float tensor of shape (len(paths), 1, 64, 64)
+        cache: TensorCache holding already normalized images (optional)
+        hashes: file_sha256() of each path, so the cache does not hash them again (optional)
+
+    Returns:
+        out
+    """
+    if cache is not None:
+        if hashes is None:
+            hashes = [None] * len(paths)
+        for i, (img_path, image_hash) in enumerate(zip(paths, hashes)):
+            out[i, 0].copy_(torch.from_numpy(cache.load(img_path, image_hash)))
+        return out
+
+    buffer = out.numpy()
+    for i, img_path in enumerate(paths):
+        normalized_array(Image.open(img_path), buffer[i, 0])
+    return out
+
+
+def iter_batches(paths, batch_size, num_workers=0, prefetch=None, cache=None, hashes=None):
+    """
+    Yields (start, images) for consecutive batches of paths.
+
+    With num_workers > 0, batches are decoded by a thread pool while the
+    caller consumes the previous ones. At most `prefetch` batches are in
+    flight at any time, so memory stays bounded regardless of len(paths).
+
+    Args:
+        paths: Image paths
+        batch_size: Number of images per batch
+        num_workers: Decode threads (0 decodes on the calling thread)
+        prefetch: Max batches decoded ahead (default: 2 * num_workers)
+        cache: TensorCache used by load_batch (optional)
+        hashes: file_sha256() of each path, passed to load_batch (optional)
+
+    Yields:
+        Tuple (start index, normalized tensor of shape (n, 1, 64, 64))
+    """
+    starts = range(0, len(paths), batch_size)
+
+    def batch_hashes(start):
+        return hashes[start:start + batch_size] if hashes is not None else None
+
+    def decode(start):
+        batch_paths = paths[start:start + batch_size]
+        return load_batch(batch_paths, torch.empty((len(batch_paths), 1, 64, 64)), cache, batch_hashes(start))
+
+    if num_workers == 0:
+        # Batch buffer reused across forward passes
+        images = torch.empty((min(batch_size, max(len(paths), 1)), 1, 64, 64))
+        for start in starts:
+            batch_paths = paths[start:start + batch_size]
+            yield start, load_batch(batch_paths, images[:len(batch_paths)], cache, batch_hashes(start))
+        return
+
+    if prefetch is None:
+        prefetch = 2 * num_workers
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        pending = deque()
+        starts = iter(starts)
+        try:
+            for start in starts:
+                pending.append((start, pool.submit(decode, start)))
+                if len(pending) >= prefetch:
+                    break
+            while pending:
+                start, future = pending.popleft()
+                next_start = next(starts, None)
+                if next_start is not None:
+                    pending.append((next_start, pool.submit(decode, next_start)))
+                yield start, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def predict_images(
+    model_path,
+    data_dir,
+    output_csv=None,
+    batch_size=256,
+    num_workers=0,
+    prefetch=None,
+    backend="auto",
+    optimize=False,
+    precision="fp32",
+    cache=True,
+    cache_dir=None,
+    cache_size_mb=1024,
+    prediction_cache_path=None,
+    rescore=False,
+):
     """
     Performs inference on images in data_dir using the trained model.
     
     Args:
-        model_path: Path to saved model (.pth file)
+        model_path: Path to saved model (.pth state_dict, .pt2 or .onnx export)
         data_dir: Path to directory containing preprocessed images
         output_csv: Path to save results CSV (optional)
+        batch_size: Number of images per forward pass
+        num_workers: Threads decoding the next batches during inference
+        prefetch: Max batches decoded ahead (default: 2 * num_workers)
+        backend: "auto", "torch" or "onnx" (see resolve_backend)
+        optimize: Run torch models channels-last and compiled with torch.compile
+        precision: "fp32", "bf16" or "fp16" (CUDA) autocast for torch models
+        cache: Reuse normalized images from the tensor cache, and the outputs
+            of this model (same weights file, backend and precision) for
+            images it already scored, across runs
+        cache_dir: Tensor cache directory (default: data/.cache/tensors)
+        cache_size_mb: Size bound of the tensor cache
+        prediction_cache_path: Prediction cache database
+            (default: data/.cache/predictions.sqlite)
+        rescore: Run the model on every image and refresh the cached predictions
     
     Returns:
         Dictionary with results and metrics
@@ -37,6 +287,15 @@ def predict_images(model_path, data_dir, output_csv=None):
     
     if not data_dir.exists():
         raise ValueError(f"Data directory {data_dir} does not exist!")
+
+    if batch_size < 1:
+        raise ValueError(f"Batch size must be positive, got {batch_size}")
+
+    if num_workers < 0:
+        raise ValueError(f"Number of workers must be >= 0, got {num_workers}")
+
+    if prefetch is not None and prefetch < 1:
+        raise ValueError(f"Prefetch depth must be positive, got {prefetch}")
     
     # Device config
     device = torch.device(
@@ -46,84 +305,99 @@ def predict_images(model_path, data_dir, output_csv=None):
     )
     print(f"Using device: {device}")
     
-    # Load model
-    model = SimpleCNN().to(device)
-    model.load_state_dict(torch.load(model_path, map_location=device, weights_only=True))
-    model.eval()
-    print(f"✓ Loaded model from {model_path}")
-    
-    # Transform (same as training)
-    transform = T.Compose([
-        T.ToTensor(),
-        T.Normalize((0.5,), (0.5,))
-    ])
-    
-    # Label mapping
-    label_names = {0: "circle", 1: "square"}
-    
-    # Results storage
-    results = []
-    correct = 0
-    total = 0
-    
+    backend, model_path = resolve_backend(model_path, backend)
+
+    paths, labels = collect_images(data_dir)
+    total = len(paths)
+    true_labels = torch.tensor(labels, dtype=torch.long)
+    predictions = torch.empty(total, dtype=torch.long)
+
+    # Images the model has to score; the others come from the prediction cache
+    pending = list(range(total))
+    prediction_cache = None
+    if cache:
+        from mlsc.cache import PredictionCache
+
+        prediction_cache = PredictionCache(prediction_cache_path)
+        # The preprocessing changes the outputs as much as the weights do
+        model_key = PredictionCache.model_key(model_path, f"{backend}:{precision}:{TRANSFORM_SIGNATURE}")
+        image_hashes = [file_sha256(img_path) for img_path in paths]
+        cached = {} if rescore else prediction_cache.get(model_key, image_hashes)
+        for i, image_hash in enumerate(image_hashes):
+            if image_hash in cached:
+                predictions[i] = int(cached[image_hash].argmax())
+        pending = [i for i, image_hash in enumerate(image_hashes) if image_hash not in cached]
+        print(f"✓ Prediction cache: {total - len(pending)} cached, {len(pending)} to score")
+
+    inference_time = 0.0
+    if pending:
+        # Load model
+        model = load_model(model_path, device, backend)
+        print(f"✓ Loaded model from {model_path}")
+
+        # ONNX Runtime and int8 models run their own kernels, not autocast ones
+        if precision != "fp32" and not isinstance(model, torch.nn.Module):
+            print(f"Precision {precision} only applies to float torch models, ignoring it")
+            precision = "fp32"
+        precision_context = nullcontext()
+        if precision != "fp32":
+            from mlsc.optimize import autocast
+
+            precision_context = autocast(device, precision)
+
+        if optimize:
+            from mlsc.optimize import optimize_model
+
+            model = optimize_model(model)
+
+        tensor_cache = None
+        if cache:
+            from mlsc.cache import open_cache
+
+            tensor_cache = open_cache(cache_dir, cache_size_mb)
+
+        pending_paths = [paths[i] for i in pending]
+        pending_hashes = [image_hashes[i] for i in pending] if cache else None
+        pending_index = torch.tensor(pending, dtype=torch.long)
+        logits = torch.empty((len(pending), len(LABEL_NAMES)))
+
+        print(f"\nRunning predictions ({precision})...")
+
+        inference_start = time.perf_counter()
+        with torch.inference_mode(), precision_context:
+            for start, images in iter_batches(
+                pending_paths, batch_size, num_workers, prefetch, tensor_cache, pending_hashes
+            ):
+                batch = images.to(device)
+                logits[start:start + len(batch)] = model(batch).float().cpu()
+        inference_time = time.perf_counter() - inference_start
+        predictions[pending_index] = logits.argmax(dim=1)
+
+        if tensor_cache is not None:
+            print(f"✓ Tensor cache: {tensor_cache.hits} hits, {tensor_cache.misses} misses")
+        if prediction_cache is not None:
+            prediction_cache.put(model_key, pending_hashes, logits.numpy())
+
+    if prediction_cache is not None:
+        prediction_cache.close()
+
     # Confusion matrix [true_label][predicted_label]
-    confusion = [[0, 0], [0, 0]]  # [[TN, FP], [FN, TP]]
-    
-    print("\nRunning predictions...")
-    
-    # Process circles (true label = 0)
-    circle_dir = data_dir / "circle"
-    if circle_dir.exists():
-        for img_path in sorted(circle_dir.glob("*.png")):
-            img = Image.open(img_path).convert("L")
-            img_tensor = transform(img).unsqueeze(0).to(device)
-            
-            with torch.no_grad():
-                output = model(img_tensor)
-                _, predicted = torch.max(output, 1)
-                pred_label = predicted.item()
-            
-            true_label = 0
-            is_correct = (pred_label == true_label)
-            
-            results.append({
-                "filename": img_path.name,
-                "true_label": label_names[true_label],
-                "predicted_label": label_names[pred_label],
-                "correct": is_correct
-            })
-            
-            confusion[true_label][pred_label] += 1
-            if is_correct:
-                correct += 1
-            total += 1
-    
-    # Process squares (true label = 1)
-    square_dir = data_dir / "square"
-    if square_dir.exists():
-        for img_path in sorted(square_dir.glob("*.png")):
-            img = Image.open(img_path).convert("L")
-            img_tensor = transform(img).unsqueeze(0).to(device)
-            
-            with torch.no_grad():
-                output = model(img_tensor)
-                _, predicted = torch.max(output, 1)
-                pred_label = predicted.item()
-            
-            true_label = 1
-            is_correct = (pred_label == true_label)
-            
-            results.append({
-                "filename": img_path.name,
-                "true_label": label_names[true_label],
-                "predicted_label": label_names[pred_label],
-                "correct": is_correct
-            })
-            
-            confusion[true_label][pred_label] += 1
-            if is_correct:
-                correct += 1
-            total += 1
+    # [[TN, FP], [FN, TP]]
+    is_correct = predictions == true_labels
+    correct = int(is_correct.sum())
+    confusion = torch.bincount(true_labels * 2 + predictions, minlength=4).view(2, 2).tolist()
+
+    results = [
+        {
+            "filename": img_path.name,
+            "true_label": LABEL_NAMES[true_label],
+            "predicted_label": LABEL_NAMES[pred_label],
+            "correct": ok
+        }
+        for img_path, true_label, pred_label, ok in zip(
+            paths, labels, predictions.tolist(), is_correct.tolist()
+        )
+    ]
     
     # Calculate metrics
     accuracy = 100 * correct / total if total > 0 else 0
@@ -136,6 +410,8 @@ def predict_images(model_path, data_dir, output_csv=None):
     print(f"Predições corretas: {correct}")
     print(f"Predições incorretas: {total - correct}")
     print(f"Acurácia: {accuracy:.2f}%")
+    if pending:
+        print(f"Tempo de inferência: {inference_time:.2f}s ({len(pending) / inference_time:.0f} imagens/s)")
     print("\nMatriz de Confusão:")
     print(f"                Predito: Circle  Predito: Square")
     print(f"Real: Circle         {confusion[0][0]:3d}            {confusion[0][1]:3d}")
@@ -152,7 +428,14 @@ def predict_images(model_path, data_dir, output_csv=None):
             print(f"  ... e mais {len(misclassified) - 10} erros")
     
     
+    csv_buffer = io.StringIO(newline='')
+    writer = csv.DictWriter(csv_buffer, fieldnames=["filename", "true_label", "predicted_label", "correct"])
+    writer.writeheader()
+    writer.writerows(results)
+    csv_text = csv_buffer.getvalue()
+
     # Save to CSV
+    unchanged = None
     if output_csv is None:
         # Default: save to data/test/results_XXX.csv with auto-incrementing number
         test_dir = Path(__file__).parent.parent / "data" / "test"
@@ -172,23 +455,32 @@ def predict_images(model_path, data_dir, output_csv=None):
             next_num = max(numbers) + 1 if numbers else 1
         else:
             next_num = 1
+
+        # Same results as the latest run: keep its file instead of a new copy
+        latest = test_dir / f"results_{next_num - 1:03d}.csv"
+        if latest.exists():
+            with open(latest, newline='') as f:
+                if f.read() == csv_text:
+                    unchanged = latest
         
         output_csv = test_dir / f"results_{next_num:03d}.csv"
     else:
         output_csv = Path(output_csv)
     
     # Write CSV
-    with open(output_csv, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=["filename", "true_label", "predicted_label", "correct"])
-        writer.writeheader()
-        writer.writerows(results)
-    print(f"\n✓ Resultados salvos em {output_csv}")
+    if unchanged is not None:
+        print(f"\n✓ Resultados inalterados desde {unchanged}")
+    else:
+        with open(output_csv, 'w', newline='') as f:
+            f.write(csv_text)
+        print(f"\n✓ Resultados salvos em {output_csv}")
     
     return {
         "accuracy": accuracy,
         "total": total,
         "correct": correct,
         "confusion_matrix": confusion,
+        "inference_time": inference_time,
         "results": results
     }
 
@@ -202,7 +494,7 @@ def main():
         "--model",
         type=str,
         default="model.pth",
-        help="Path to trained model file (default: model.pth)"
+        help="Path to trained model file, .pth or exported .pt2/.onnx (default: model.pth)"
     )
     parser.add_argument(
         "--data",
@@ -216,11 +508,89 @@ def main():
         default=None,
         help="Path to save results CSV (default: auto-generate in data/test/results_XXX.csv)"
     )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="auto",
+        help="Inference backend (default: auto, ONNX Runtime for .onnx models)"
+    )
+    parser.add_argument(
+        "--prediction-cache",
+        type=str,
+        default=None,
+        help="Prediction cache database (default: data/.cache/predictions.sqlite)"
+    )
+    parser.add_argument(
+        "--rescore",
+        action="store_true",
+        help="Run the model on every image, refreshing cached predictions"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disable the tensor and prediction caches"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Tensor cache directory (default: data/.cache/tensors)"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=1024,
+        help="Tensor cache size bound in MB (default: 1024)"
+    )
+    parser.add_argument(
+        "--precision",
+        choices=("fp32", "bf16", "fp16"),
+        default="fp32",
+        help="Autocast precision for torch models (bf16 on CPU/GPU, fp16 on CUDA)"
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Run channels-last and compiled with torch.compile (falls back to eager)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Number of images per forward pass (default: 256)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="Threads decoding images ahead of the model (0 = main thread)"
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=None,
+        help="Max batches decoded ahead (default: 2 * workers)"
+    )
     
     args = parser.parse_args()
     
     try:
-        predict_images(args.model, args.data, args.output)
+        predict_images(
+            args.model,
+            args.data,
+            args.output,
+            args.batch_size,
+            args.workers,
+            args.prefetch,
+            args.backend,
+            args.optimize,
+            args.precision,
+            not args.no_cache,
+            args.cache_dir,
+            args.cache_size,
+            args.prediction_cache,
+            args.rescore,
+        )
     except Exception as e:
         print(f"Error: {e}")
         import traceback
@@ -2,25 +2,178 @@
 preprocess.py
 Author: Lennin Abrão Sousa Santos
 Data criação: 2026-02-02
-Date update: 2026-02-02
+Date update: 2026-10-17
 Explicação: Preprocesses images for inference (resize, normalize, etc).
-How to use: uv run mlsc preprocess --input <input_dir> --output <output_dir>
+How to use: uv run mlsc preprocess --input <input_dir> --output <output_dir> [--workers K] [--incremental]
 Licença: AGPL3
 """
 
 from pathlib import Path
 from PIL import Image
-import torchvision.transforms as T
+from concurrent.futures import ProcessPoolExecutor
 import argparse
+import hashlib
+import json
+import os
 
+import numpy as np
 
-def preprocess_images(input_dir, output_dir=None):
+MANIFEST_NAME = ".preprocess_manifest.json"
+# Identifies the output of normalized_array(); change it whenever transform()
+# or the normalization changes, so cached arrays are not reused
+TRANSFORM_SIGNATURE = "draft-L:resize64-bilinear-gap2:norm0.5-0.5"
+
+
+def transform(img):
+    """
+    Preprocessing transform: grayscale 64x64, in a single pass over the image.
+
+    Large photos dominate the cost, so the work is done on as few pixels as
+    possible:
+    1. draft() makes the JPEG decoder produce grayscale directly at 1/2,
+       1/4 or 1/8 scale (still at least 64x64); other formats ignore it.
+    2. Conversion to 'L' happens before resizing, on one channel instead of
+       three or four.
+    3. reducing_gap=2.0 shrinks by an integer factor (box filter) down to
+       about twice the target before the bilinear resize.
+
+    Apply it to a freshly opened image (draft() only works before loading).
+    Like T.Compose([T.Resize((64, 64)), T.Grayscale()]) up to rounding,
+    without importing torch/torchvision.
+    """
+    img.draft("L", (64, 64))
+    if img.mode != "L":
+        img = img.convert("L")
+    return img.resize((64, 64), Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+def normalized_array(img, out=None):
+    """
+    Model input for one image as a (64, 64) float32 array in [-1, 1]: transform()
+    when the image is not already 64x64 grayscale, then the equivalent of
+    ToTensor + Normalize((0.5,), (0.5,)).
+
+    Args:
+        img: PIL image
+        out: float32 (64, 64) array to write into, e.g. a view of one slot
+            of a batch buffer (default: a new array)
+    """
+    if img.mode != "L" or img.size != (64, 64):
+        img = transform(img)
+    if out is None:
+        out = np.empty((64, 64), dtype=np.float32)
+    np.divide(np.asarray(img), np.float32(255), out=out)
+    out -= 0.5
+    out /= 0.5
+    return out
+
+
+def process_image(src, dst):
+    """Resizes/grayscales one image and saves it (runs in worker processes)."""
+    transform(Image.open(src)).save(dst)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir, manifest):
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def process_jobs(jobs, output_dir, workers=1, incremental=False):
+    """
+    Runs process_image over (src, dst) pairs.
+
+    In incremental mode a manifest in output_dir records size, mtime and
+    SHA-256 of every processed input. An input is skipped when its output
+    exists, was produced by the current transform, and either its size/mtime
+    or, failing that, its content hash is unchanged since the last run.
+
+    Args:
+        jobs: List of (src, dst) paths, dst inside output_dir
+        output_dir: Root of the outputs, where the manifest lives
+        workers: Processes used for decoding/resizing (1 runs inline)
+        incremental: Skip inputs already processed
+
+    Returns:
+        Tuple (processed, skipped)
+    """
+    if workers < 1:
+        raise ValueError(f"Number of workers must be positive, got {workers}")
+
+    output_dir = Path(output_dir)
+    manifest = load_manifest(output_dir) if incremental else {}
+    todo = []
+    skipped = 0
+
+    for src, dst in jobs:
+        key = Path(dst).relative_to(output_dir).as_posix()
+        stat = os.stat(src)
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "transform": TRANSFORM_SIGNATURE}
+        previous = manifest.get(key)
+
+        if (
+            incremental
+            and previous is not None
+            and previous.get("transform") == TRANSFORM_SIGNATURE
+            and Path(dst).exists()
+        ):
+            if previous["size"] == entry["size"] and previous["mtime_ns"] == entry["mtime_ns"]:
+                skipped += 1
+                continue
+            entry["sha256"] = file_sha256(src)
+            if previous.get("sha256") == entry["sha256"]:
+                manifest[key] = entry
+                skipped += 1
+                continue
+
+        if incremental and "sha256" not in entry:
+            entry["sha256"] = file_sha256(src)
+        todo.append((src, dst, key, entry))
+
+    if workers == 1:
+        for src, dst, _, _ in todo:
+            process_image(src, dst)
+    elif todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            srcs, dsts = [job[0] for job in todo], [job[1] for job in todo]
+            # Consume results so worker exceptions are raised here
+            list(pool.map(process_image, srcs, dsts, chunksize=16))
+
+    if incremental:
+        for _, _, key, entry in todo:
+            manifest[key] = entry
+        save_manifest(output_dir, manifest)
+
+    return len(todo), skipped
+
+
+def preprocess_images(input_dir, output_dir=None, workers=1, incremental=False):
     """
     Preprocesses images from input directory and saves to output directory.
     
     Args:
         input_dir: Path to directory containing raw images (with circle/ and square/ subdirs)
         output_dir: Path to save processed images (defaults to data/processed)
+        workers: Processes used to resize/grayscale images (default: 1)
+        incremental: Skip images unchanged since the previous run
     """
     input_path = Path(input_dir)
     
@@ -33,49 +186,22 @@ def preprocess_images(input_dir, output_dir=None):
     else:
         output_dir = Path(output_dir)
     
-    # Create output subdirectories
-    circle_out = output_dir / "circle"
-    square_out = output_dir / "square"
-    
-    circle_out.mkdir(parents=True, exist_ok=True)
-    square_out.mkdir(parents=True, exist_ok=True)
-    
-    # Define preprocessing transform (same as training)
-    # Resize to 64x64, convert to grayscale, save as PNG
-    transform = T.Compose([
-        T.Resize((64, 64)),
-        T.Grayscale(num_output_channels=1)
-    ])
-    
-    processed_count = 0
-    
     print(f"Preprocessing images from {input_path} to {output_dir}")
     
-    # Process circles
-    circle_in = input_path / "circle"
-    if circle_in.exists():
-        for img_path in circle_in.glob("*.png"):
-            img = Image.open(img_path)
-            img_processed = transform(img)
-            
-            # Save with same filename
-            output_path = circle_out / img_path.name
-            img_processed.save(output_path)
-            processed_count += 1
-    
-    # Process squares
-    square_in = input_path / "square"
-    if square_in.exists():
-        for img_path in square_in.glob("*.png"):
-            img = Image.open(img_path)
-            img_processed = transform(img)
-            
-            # Save with same filename
-            output_path = square_out / img_path.name
-            img_processed.save(output_path)
-            processed_count += 1
+    # Save each image with the same filename under the same class subdir
+    jobs = []
+    for class_name in ["circle", "square"]:
+        class_in = input_path / class_name
+        class_out = output_dir / class_name
+        class_out.mkdir(parents=True, exist_ok=True)
+        if class_in.exists():
+            jobs.extend((img_path, class_out / img_path.name) for img_path in class_in.glob("*.png"))
+
+    processed_count, skipped_count = process_jobs(jobs, output_dir, workers, incremental)
     
     print(f"✓ Processed {processed_count} images")
+    if incremental:
+        print(f"✓ Skipped {skipped_count} unchanged images")
     print(f"✓ Saved to {output_dir}")
 
 
@@ -96,11 +222,22 @@ def main():
         default=None,
         help="Output directory (default: data/processed)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Parallel processes (default: 1)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip images unchanged since the previous run"
+    )
     
     args = parser.parse_args()
     
     try:
-        preprocess_images(args.input, args.output)
+        preprocess_images(args.input, args.output, args.workers, args.incremental)
     except Exception as e:
         print(f"Error: {e}")
         return 1
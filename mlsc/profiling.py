@@ -0,0 +1,104 @@
+"""
+profiling.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Per-stage timing, throughput and peak memory instrumentation for the training loop.
+How to use: uv run mlsc train --profile [--profile-trace trace.json]
+Licença: AGPL3
+"""
+
+import sys
+import time
+
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TRAIN_STAGES = ("data", "h2d", "forward", "backward", "optimizer")
+
+
+class StageTimer:
+    def __init__(self, device, enabled=True):
+        """
+        Accumulates wall time per training stage with lap(): each call charges
+        the time since the previous one to the given stage. On CUDA the device
+        is synchronized first, otherwise asynchronous kernels would be charged
+        to whichever stage happens to wait for them.
+
+        When disabled every method is a no-op, so the loop can call it
+        unconditionally.
+        """
+        self.device = device
+        self.enabled = enabled
+        self.reset()
+
+    def _now(self):
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+        return time.perf_counter()
+
+    def reset(self):
+        """Starts a new epoch: clears the totals and the samples count."""
+        self.totals = dict.fromkeys(TRAIN_STAGES + ("validation",), 0.0)
+        self.samples = 0
+        if self.enabled:
+            if self.device.type == "cuda":
+                torch.cuda.reset_peak_memory_stats(self.device)
+            self.last = self._now()
+
+    def lap(self, stage):
+        if self.enabled:
+            now = self._now()
+            self.totals[stage] += now - self.last
+            self.last = now
+
+    def summary(self):
+        """One line with the per-stage times, training throughput and peak memory."""
+        train_time = sum(self.totals[stage] for stage in TRAIN_STAGES)
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.totals.items())
+        throughput = self.samples / train_time if train_time > 0 else 0.0
+        return f"  {stages} | {throughput:.0f} samples/s | peak memory {peak_memory_mb(self.device)}"
+
+
+def peak_memory_mb(device):
+    """
+    Peak allocated memory of the epoch on CUDA, otherwise the peak resident
+    set size of the process (includes the DataLoader's main-process buffers,
+    not its workers).
+    """
+    if device.type == "cuda":
+        return f"{torch.cuda.max_memory_allocated(device) / 2**20:.1f} MB (CUDA)"
+    if resource is None:
+        return "n/a"
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    peak /= 2**20 if sys.platform == "darwin" else 2**10
+    return f"{peak:.1f} MB (RSS)"
+
+
+def trace_profiler(device, trace_path, active_steps=5):
+    """
+    torch.profiler session covering `active_steps` training steps after one
+    skipped and one warm-up step; the trace is written to `trace_path` in
+    Chrome trace format (open in chrome://tracing or Perfetto). Call step()
+    after every training step.
+    """
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if device.type == "cuda":
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+
+    def export(prof):
+        prof.export_chrome_trace(str(trace_path))
+        print(f"✓ Profiler trace saved to {trace_path}")
+
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(wait=1, warmup=1, active=active_steps, repeat=1),
+        on_trace_ready=export,
+        record_shapes=True,
+        profile_memory=True,
+    )
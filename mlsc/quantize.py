@@ -0,0 +1,260 @@
+"""
+quantize.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Post-training int8 quantization of SimpleCNN for CPU inference.
+How to use: uv run mlsc quantize --model <model_path> [--mode static|dynamic]
+Licença: AGPL3
+"""
+
+import argparse
+import copy
+import random
+import time
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from mlsc.model import SimpleCNN
+from mlsc.predict import collect_images, iter_batches, load_model
+
+MODES = ("static", "dynamic")
+EXAMPLE_INPUT = (torch.zeros((1, 1, 64, 64)),)
+
+
+@contextmanager
+def quiet_quantization_warnings():
+    """
+    torch.ao.quantization still ships and runs the fbgemm/x86 int8 kernels,
+    but warns about its deprecation on every call; keep the output readable.
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*torch.ao.quantization is deprecated.*")
+        warnings.filterwarnings("ignore", message=".*reduce_range will be deprecated.*")
+        warnings.filterwarnings("ignore", message=".*quantized tensor creation functions.*")
+        yield
+
+
+class QuantizedModel:
+    def __init__(self, module):
+        """Int8 kernels only run on the CPU: move inputs there first."""
+        self.module = module
+
+    def __call__(self, images):
+        return self.module(images.cpu())
+
+
+def quantize(float_model, mode="static", calibration_batches=()):
+    """
+    Args:
+        float_model: SimpleCNN in eval mode (not modified)
+        mode: "static" quantizes convs and fc, with activation ranges
+            observed on calibration_batches; "dynamic" quantizes fc only
+        calibration_batches: Iterable of normalized (N, 1, 64, 64) tensors
+
+    Returns:
+        Quantized module
+    """
+    model = copy.deepcopy(float_model).eval()
+    with quiet_quantization_warnings():
+        if mode == "dynamic":
+            return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+        prepared = prepare_fx(model, get_default_qconfig_mapping("x86"), EXAMPLE_INPUT)
+        with torch.inference_mode():
+            for images in calibration_batches:
+                prepared(images)
+        return convert_fx(prepared)
+
+
+def load_quantized(checkpoint):
+    """
+    Rebuilds a model saved by quantize_model: the quantized graph is
+    recreated from a fresh SimpleCNN, then the int8 weights and observed
+    scales/zero points are loaded into it.
+
+    The observers see one example batch, only so that converting does not
+    warn about uncalibrated ranges; load_state_dict overwrites them anyway.
+    """
+    mode = checkpoint["quantization"]
+    if mode not in MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}")
+
+    model = quantize(SimpleCNN(), mode, EXAMPLE_INPUT)
+    with quiet_quantization_warnings():
+        model.load_state_dict(checkpoint["state_dict"])
+    return QuantizedModel(model)
+
+
+def evaluate(model, paths, labels, batch_size=256, repeats=3):
+    """
+    Returns:
+        Tuple (accuracy %, best wall time in seconds over `repeats` runs)
+    """
+    batches = [images.clone() for _, images in iter_batches(paths, batch_size)]
+    true_labels = torch.tensor(labels, dtype=torch.long)
+
+    best = float("inf")
+    with torch.inference_mode():
+        model(batches[0])  # warm-up
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predictions = torch.cat([model(images).argmax(dim=1) for images in batches])
+            best = min(best, time.perf_counter() - start)
+
+    accuracy = 100 * (predictions == true_labels).sum().item() / len(labels)
+    return accuracy, best
+
+
+def quantize_model(
+    model_path="model.pth",
+    output_path=None,
+    mode="static",
+    calibration_dir=None,
+    calibration_size=512,
+    test_dir=None,
+    batch_size=256,
+):
+    """
+    Quantizes a trained SimpleCNN to int8, saves it and reports accuracy and
+    speed against the float model.
+
+    Args:
+        model_path: Path to saved model (.pth file)
+        output_path: Where to save the int8 model (default: <model>_int8.pth),
+            loadable by predict/serve like any .pth
+        mode: "static" or "dynamic"
+        calibration_dir: Images used to observe activation ranges (default: data/raw)
+        calibration_size: Number of calibration images sampled from calibration_dir
+        test_dir: Labeled images for the comparison (default: data/test)
+        batch_size: Images per forward pass
+
+    Returns:
+        Dictionary with accuracies, timings and speedup
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+
+    base_dir = Path(__file__).parent.parent
+    model_path = Path(model_path)
+    calibration_dir = Path(calibration_dir or base_dir / "data" / "raw")
+    test_dir = Path(test_dir or base_dir / "data" / "test")
+
+    if not model_path.exists():
+        raise ValueError(f"Model file {model_path} does not exist!")
+
+    if output_path is None:
+        output_path = model_path.with_name(f"{model_path.stem}_int8.pth")
+    else:
+        output_path = Path(output_path)
+
+    float_model = load_model(model_path, torch.device("cpu"), "torch")
+
+    calibration_batches = []
+    if mode == "static":
+        paths, _ = collect_images(calibration_dir)
+        if not paths:
+            raise ValueError(f"No calibration images in {calibration_dir}! Run mlsc generate first.")
+        paths = random.Random(0).sample(paths, min(calibration_size, len(paths)))
+        print(f"Calibrating on {len(paths)} images from {calibration_dir}")
+        calibration_batches = (images for _, images in iter_batches(paths, batch_size))
+
+    quantized = quantize(float_model, mode, calibration_batches)
+    torch.save({"quantization": mode, "state_dict": quantized.state_dict()}, output_path)
+    print(f"✓ Saved {mode} int8 model to {output_path}")
+
+    paths, labels = collect_images(test_dir)
+    if not paths:
+        raise ValueError(f"No test images in {test_dir}!")
+
+    float_acc, float_time = evaluate(float_model, paths, labels, batch_size)
+    int8_acc, int8_time = evaluate(QuantizedModel(quantized), paths, labels, batch_size)
+    float_size = model_path.stat().st_size
+    int8_size = output_path.stat().st_size
+
+    print("\n" + "="*60)
+    print(f"Float32 vs int8 ({mode}) on {len(paths)} images from {test_dir}")
+    print("="*60)
+    print(f"Accuracy:  {float_acc:6.2f}% -> {int8_acc:6.2f}% (delta {int8_acc - float_acc:+.2f})")
+    print(f"Time:      {float_time * 1000:8.1f} ms -> {int8_time * 1000:8.1f} ms "
+          f"(speedup {float_time / int8_time:.2f}x)")
+    print(f"File size: {float_size / 1024:8.1f} KB -> {int8_size / 1024:8.1f} KB")
+    print("="*60)
+
+    return {
+        "float_accuracy": float_acc,
+        "int8_accuracy": int8_acc,
+        "float_seconds": float_time,
+        "int8_seconds": int8_time,
+        "speedup": float_time / int8_time,
+    }
+
+
+def main():
+    """CLI entry point for quantize command."""
+    parser = argparse.ArgumentParser(
+        description="Quantize the trained model to int8 for CPU inference"
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default="model.pth",
+        help="Path to trained model file (default: model.pth)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Output path (default: <model>_int8.pth)"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default="static",
+        help="static: convs + fc with calibration, dynamic: fc only (default: static)"
+    )
+    parser.add_argument(
+        "--calibration-data",
+        type=str,
+        default=None,
+        help="Calibration images with circle/ and square/ subdirs (default: data/raw)"
+    )
+    parser.add_argument(
+        "--calibration-size",
+        type=int,
+        default=512,
+        help="Number of calibration images (default: 512)"
+    )
+    parser.add_argument(
+        "--test-data",
+        type=str,
+        default=None,
+        help="Labeled images for the float vs int8 comparison (default: data/test)"
+    )
+
+    args = parser.parse_args()
+
+    try:
+        quantize_model(
+            args.model,
+            args.output,
+            args.mode,
+            args.calibration_data,
+            args.calibration_size,
+            args.test_data,
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
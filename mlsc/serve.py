@@ -0,0 +1,251 @@
+"""
+serve.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Local HTTP inference server that keeps the trained model loaded.
+How to use: uv run mlsc serve --model <model_path> [--host 127.0.0.1] [--port 8000] [--max-batch-size 64] [--max-wait-ms 2]
+Licença: AGPL3
+"""
+
+import argparse
+import asyncio
+import base64
+import binascii
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import torch
+from PIL import Image
+
+from mlsc.batching import MicroBatcher
+from mlsc.predict import BACKENDS, LABEL_NAMES, load_model
+from mlsc.preprocess import normalized_array
+
+# Refuse request bodies larger than this (bytes)
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+
+def decode_image(data):
+    """
+    Decodes image bytes into a normalized (1, 64, 64) tensor, resizing and
+    converting to grayscale first when the image is not already 64x64 'L'.
+    """
+    return torch.from_numpy(normalized_array(Image.open(io.BytesIO(data)))).unsqueeze(0)
+
+
+def to_predictions(logits):
+    """
+    Converts a batch of logits into response entries.
+
+    Returns:
+        List of {"label", "probabilities"} dicts, one per row
+    """
+    probabilities = torch.softmax(logits, dim=1)
+    return [
+        {
+            "label": LABEL_NAMES[int(p.argmax())],
+            "probabilities": {LABEL_NAMES[i]: float(p[i]) for i in LABEL_NAMES},
+        }
+        for p in probabilities
+    ]
+
+
+def make_handler(batcher, loop):
+    class PredictHandler(BaseHTTPRequestHandler):
+        """
+        GET  /health   -> {"status": "ok"}
+        POST /predict  -> body is either raw image bytes (one image) or JSON
+                          {"images": ["<base64>", ...]} (many images)
+        """
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.send_json(200, {"status": "ok"})
+            else:
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+            except ValueError:
+                length = -1
+            # rfile.read(-1) would block until the client closes the connection
+            if length < 0:
+                self.send_json(400, {"error": "Invalid Content-Length"})
+                return
+            if length > MAX_BODY_SIZE:
+                self.send_json(413, {"error": f"Body larger than {MAX_BODY_SIZE} bytes"})
+                return
+            body = self.rfile.read(length)
+
+            try:
+                content_type = self.headers.get("Content-Type", "")
+                if content_type.startswith("application/json"):
+                    encoded = json.loads(body)["images"]
+                    blobs = [base64.b64decode(item, validate=True) for item in encoded]
+                else:
+                    blobs = [body]
+                if not blobs:
+                    raise ValueError("No images in request")
+                images = [decode_image(blob) for blob in blobs]
+            # OSError covers truncated/corrupt files (UnidentifiedImageError too)
+            except (
+                KeyError,
+                TypeError,
+                ValueError,
+                binascii.Error,
+                OSError,
+                Image.DecompressionBombError,
+            ) as e:
+                self.send_json(400, {"error": f"Invalid request: {e}"})
+                return
+
+            try:
+                # Images from all concurrent requests are batched together
+                rows = asyncio.run_coroutine_threadsafe(batcher.predict_many(images), loop).result()
+            except Exception as e:
+                self.send_json(500, {"error": f"Prediction failed: {e}"})
+                return
+            self.send_json(200, {"predictions": to_predictions(torch.stack(rows))})
+
+    return PredictHandler
+
+
+def serve(
+    model_path="model.pth",
+    host="127.0.0.1",
+    port=8000,
+    max_batch_size=64,
+    max_wait_ms=2.0,
+    backend="auto",
+):
+    """
+    Loads the model once and serves predictions over HTTP until interrupted.
+
+    Args:
+        model_path: Path to saved model (.pth state_dict, .pt2 or .onnx export)
+        host: Interface to bind (default: localhost only)
+        port: TCP port
+        max_batch_size: Largest batch of images per forward pass
+        max_wait_ms: Longest time an image waits for others to batch with
+        backend: "auto", "torch" or "onnx" (see predict.resolve_backend)
+    """
+    model_path = Path(model_path)
+    if not model_path.exists():
+        raise ValueError(f"Model file {model_path} does not exist!")
+
+    # Device config
+    device = torch.device(
+        "cuda"
+        if torch.cuda.is_available()
+        else ("mps" if torch.backends.mps.is_available() else "cpu")
+    )
+    print(f"Using device: {device}")
+
+    model = load_model(model_path, device, backend)
+    print(f"✓ Loaded model from {model_path}")
+
+    # Warm-up pass so the first request does not pay for lazy initialization
+    with torch.inference_mode():
+        model(torch.zeros((1, 1, 64, 64), device=device))
+
+    # The batcher lives on an event loop in a background thread; HTTP
+    # handler threads submit to it and block on the result
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+    batcher = MicroBatcher(model, device, max_batch_size, max_wait_ms)
+    asyncio.run_coroutine_threadsafe(batcher.start(), loop).result()
+
+    server = ThreadingHTTPServer((host, port), make_handler(batcher, loop))
+    print(f"✓ Serving on http://{host}:{server.server_port} (POST /predict, GET /health)")
+    print(f"✓ Micro-batching up to {max_batch_size} images, waiting at most {max_wait_ms} ms")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        asyncio.run_coroutine_threadsafe(batcher.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+
+
+def main():
+    """CLI entry point for serve command."""
+    parser = argparse.ArgumentParser(
+        description="Serve predictions over HTTP with a warm model"
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        default="model.pth",
+        help="Path to trained model file, .pth or exported .pt2/.onnx (default: model.pth)"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="auto",
+        help="Inference backend (default: auto, ONNX Runtime for .onnx models)"
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Interface to bind (default: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="TCP port (default: 8000)"
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=64,
+        help="Largest batch of images per forward pass (default: 64)"
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=2.0,
+        help="Longest time an image waits for others to batch with (default: 2)"
+    )
+
+    args = parser.parse_args()
+
+    try:
+        serve(
+            args.model,
+            args.host,
+            args.port,
+            args.max_batch_size,
+            args.max_wait_ms,
+            args.backend,
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,337 @@
+"""
+sweep.py
+Author: Lennin Abrão Sousa Santos
+Data criação: 2026-10-17
+Date update: 2026-10-17
+Explicação: Parallel hyperparameter sweep (grid or random search) over train.train().
+How to use: uv run mlsc sweep --spec sweep.json [--parallel N] [--threads-per-trial T]
+Licença: AGPL3
+"""
+
+import argparse
+import contextlib
+import csv
+import hashlib
+import inspect
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import torch
+
+from mlsc.pack import CLASS_NAMES, IMAGES_FILE, pack_dataset
+from mlsc.train import train
+
+METHODS = ("grid", "random")
+# Decided by the sweep itself, not by the spec
+RESERVED_PARAMS = {"packed_dir", "in_memory", "output", "checkpoint", "resume", "seed", "distributed"}
+# Written next to the pack the sweep builds itself
+SOURCE_FILE = "source.json"
+
+
+def load_spec(spec_path):
+    """
+    Reads a sweep spec (JSON):
+
+        {
+            "method": "grid" | "random",
+            "trials": 20,                     # random only
+            "params": {
+                "learning_rate": {"low": 1e-4, "high": 1e-2, "log": true},
+                "batch_size": [32, 64, 128],
+                "num_epochs": [5, 10]
+            },
+            "fixed": {"patience": 3}          # passed to every trial
+        }
+
+    Grid search takes the product of the lists; random search draws `trials`
+    combinations, a list meaning a uniform choice and a {"low", "high"} range
+    a uniform (or log-uniform) float.
+    """
+    with open(spec_path) as f:
+        spec = json.load(f)
+
+    method = spec.get("method", "grid")
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+
+    params = spec.get("params", {})
+    fixed = spec.get("fixed", {})
+    if not params:
+        raise ValueError(f"Spec {spec_path} has no params to sweep")
+
+    allowed = set(inspect.signature(train).parameters) - RESERVED_PARAMS
+    unknown = (set(params) | set(fixed)) - allowed
+    if unknown:
+        raise ValueError(f"Unknown train() parameters {sorted(unknown)}")
+
+    for name, values in params.items():
+        if isinstance(values, dict):
+            if method == "grid":
+                raise ValueError(f"Grid search needs a list of values for {name!r}")
+            if not {"low", "high"} <= set(values):
+                raise ValueError(f"Range for {name!r} needs 'low' and 'high'")
+        elif not isinstance(values, list) or not values:
+            raise ValueError(f"Values of {name!r} must be a non-empty list or a range")
+
+    if method == "random" and spec.get("trials", 0) < 1:
+        raise ValueError("Random search needs a positive 'trials' count")
+
+    return spec
+
+
+def sample(values, rng):
+    if isinstance(values, list):
+        return rng.choice(values)
+    low, high = values["low"], values["high"]
+    if values.get("log", False):
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    return rng.uniform(low, high)
+
+
+def expand_trials(spec, seed=0):
+    """List of trial configurations (dicts of train() keyword arguments)."""
+    params, fixed = spec["params"], spec.get("fixed", {})
+    if spec.get("method", "grid") == "grid":
+        names = list(params)
+        combos = [dict(zip(names, values)) for values in itertools.product(*params.values())]
+    else:
+        rng = random.Random(seed)
+        combos = [
+            {name: sample(values, rng) for name, values in params.items()}
+            for _ in range(spec["trials"])
+        ]
+    return [{**fixed, **combo} for combo in combos]
+
+
+def source_fingerprint(data_dir=None):
+    """
+    Describes the images pack_dataset would read: the source directory, the
+    number of files and a hash of their names, sizes and mtimes.
+    """
+    if data_dir is None:
+        data_dir = Path(__file__).parent.parent / "data" / "raw"
+    data_dir = Path(data_dir).resolve()
+
+    digest = hashlib.sha256()
+    count = 0
+    for class_name in CLASS_NAMES:
+        for img_path in sorted((data_dir / class_name).glob("*.png")):
+            stat = img_path.stat()
+            digest.update(f"{class_name}/{img_path.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+            count += 1
+    return {"source": str(data_dir), "files": count, "digest": digest.hexdigest()}
+
+
+def ensure_packed(data_dir, packed_dir):
+    """Packs data_dir into packed_dir unless the pack there was built from the same files."""
+    fingerprint = source_fingerprint(data_dir)
+    source_path = packed_dir / SOURCE_FILE
+    if (packed_dir / IMAGES_FILE).exists() and source_path.exists():
+        with open(source_path) as f:
+            if json.load(f) == fingerprint:
+                print(f"✓ Reusing packed dataset in {packed_dir}")
+                return
+
+    source_path.unlink(missing_ok=True)
+    pack_dataset(data_dir, packed_dir)
+    with open(source_path, "w") as f:
+        json.dump(fingerprint, f, indent=2)
+
+
+def limit_threads(threads):
+    """Process pool initializer: keeps concurrent trials from oversubscribing the cores."""
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def run_trial(index, config, packed_dir, output_dir, seed):
+    """
+    Trains one configuration with its output redirected to trial_XXX.log.
+
+    Returns:
+        Tuple (index, metrics dict or None, error message or None)
+    """
+    name = f"trial_{index:03d}"
+    with open(output_dir / f"{name}.log", "w") as log, contextlib.redirect_stdout(log):
+        print(f"Config: {config}")
+        try:
+            metrics = train(
+                packed_dir=packed_dir,
+                output=output_dir / f"{name}.pth",
+                seed=seed,
+                **config,
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            return index, None, str(e)
+    return index, metrics, None
+
+
+def write_leaderboard(rows, output_dir):
+    """Saves the ranked trials as leaderboard.csv and leaderboard.json."""
+    param_names = sorted({name for row in rows for name in row["config"]})
+    fieldnames = ["rank", "trial", "val_acc", "best_epoch", "epochs", "seconds"] + param_names + ["error"]
+
+    with open(output_dir / "leaderboard.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                **{k: v for k, v in row.items() if k != "config"},
+                **row["config"],
+            })
+
+    with open(output_dir / "leaderboard.json", "w") as f:
+        json.dump(rows, f, indent=2, default=str)
+
+
+def run_sweep(
+    spec_path,
+    data_dir=None,
+    packed_dir=None,
+    output_dir="sweeps",
+    parallel=None,
+    threads_per_trial=None,
+    seed=0,
+):
+    """
+    Runs every trial of the spec in a process pool and ranks them by
+    validation accuracy (ties broken by wall time).
+
+    The PNGs are decoded once into a packed dataset that every trial
+    memory-maps, so all trials share one copy through the page cache.
+
+    Args:
+        spec_path: JSON sweep spec (see load_spec)
+        data_dir: Images to pack when packed_dir is not given (default: data/raw);
+            the pack is rebuilt whenever these files change
+        packed_dir: Existing packed dataset (mlsc pack) to use as is
+        output_dir: Where models, logs and the leaderboard are written
+        parallel: Concurrent trials (default: cpu_count // threads_per_trial)
+        threads_per_trial: torch threads per trial (default: cpu_count // parallel)
+        seed: Seed of every trial (same split and init) and of random search
+
+    Returns:
+        List of leaderboard rows, best first
+    """
+    spec = load_spec(spec_path)
+    trials = expand_trials(spec, seed)
+
+    cpu_count = os.cpu_count() or 1
+    if parallel is None:
+        parallel = cpu_count // threads_per_trial if threads_per_trial else cpu_count
+        parallel = max(1, min(parallel, len(trials)))
+    if threads_per_trial is None:
+        threads_per_trial = max(1, cpu_count // parallel)
+    if parallel < 1 or threads_per_trial < 1:
+        raise ValueError("parallel and threads_per_trial must be positive")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    if packed_dir is None:
+        packed_dir = output_dir / "packed"
+        ensure_packed(data_dir, packed_dir)
+    elif not (Path(packed_dir) / IMAGES_FILE).exists():
+        raise ValueError(f"No packed dataset in {packed_dir}, run mlsc pack first")
+
+    print(
+        f"Running {len(trials)} trial(s), {parallel} at a time with "
+        f"{threads_per_trial} thread(s) each..."
+    )
+
+    rows = []
+    sweep_start = time.perf_counter()
+    # spawn: trials must not inherit the parent's torch thread pools
+    with ProcessPoolExecutor(
+        max_workers=parallel,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=limit_threads,
+        initargs=(threads_per_trial,),
+    ) as pool:
+        futures = {
+            pool.submit(run_trial, i, config, packed_dir, output_dir, seed): i
+            for i, config in enumerate(trials)
+        }
+        for future in as_completed(futures):
+            try:
+                index, metrics, error = future.result()
+            except Exception as e:
+                # The trial's process died (OOM kill, crash in a kernel); this
+                # breaks the pool, so the trials still pending fail here too
+                index, metrics, error = futures[future], None, f"{type(e).__name__}: {e}"
+            row = {
+                "trial": index,
+                "val_acc": metrics["best_acc"] if metrics else None,
+                "best_epoch": metrics["best_epoch"] if metrics else None,
+                "epochs": metrics["epochs"] if metrics else None,
+                "seconds": round(metrics["seconds"], 2) if metrics else None,
+                "error": error,
+                "config": trials[index],
+            }
+            rows.append(row)
+            status = f"val acc {row['val_acc']:.2f}% in {row['seconds']:.1f}s" if metrics else f"failed: {error}"
+            print(f"  trial {index:03d} {trials[index]}: {status}")
+
+    # Failed trials last
+    rows.sort(key=lambda r: (r["val_acc"] is None, -(r["val_acc"] or 0), r["seconds"] or 0))
+    for rank, row in enumerate(rows, 1):
+        row["rank"] = rank
+
+    write_leaderboard(rows, output_dir)
+
+    print("\n" + "=" * 60)
+    print(f"LEADERBOARD ({time.perf_counter() - sweep_start:.1f}s total)")
+    print("=" * 60)
+    for row in rows[:10]:
+        if row["error"] is None:
+            print(f"{row['rank']:3d}. trial {row['trial']:03d}  {row['val_acc']:6.2f}%  {row['seconds']:8.1f}s  {row['config']}")
+        else:
+            print(f"{row['rank']:3d}. trial {row['trial']:03d}  failed  {row['config']}")
+    print("=" * 60)
+    print(f"✓ Leaderboard saved to {output_dir / 'leaderboard.csv'}")
+
+    return rows
+
+
+def main():
+    """CLI entry point for sweep command."""
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep")
+    parser.add_argument("--spec", type=str, required=True, help="JSON sweep spec")
+    parser.add_argument("--data", type=str, default=None, help="Images to train on (default: data/raw)")
+    parser.add_argument("--packed", type=str, default=None, help="Use this packed dataset instead of --data")
+    parser.add_argument("--output", type=str, default="sweeps", help="Output directory (default: sweeps)")
+    parser.add_argument("--parallel", type=int, default=None, help="Concurrent trials (default: fill the cores)")
+    parser.add_argument("--threads-per-trial", type=int, default=None, help="torch threads per trial")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of every trial (default: 0)")
+
+    args = parser.parse_args()
+
+    try:
+        run_sweep(
+            args.spec,
+            args.data,
+            args.packed,
+            args.output,
+            args.parallel,
+            args.threads_per_trial,
+            args.seed,
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
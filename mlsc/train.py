@@ -2,50 +2,281 @@
 train.py
 Author: Lennin Abrão Sousa Santos
 Data criação: 2026-01-29
-Date update: 2026-01-29
+Date update: 2026-10-17
 Explicação: Training script for the SimpleCNN model.
-How to use: uv run mlsc train
+How to use: uv run mlsc train [--packed [<packed_dir>] | --synthetic] [--in-memory] [--epochs N] [--checkpoint <path>] [--resume] [--patience N] ...
 Licença: AGPL3
 """
 
+import os
+import random
+import time
+from itertools import islice
+from pathlib import Path
+
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, random_split
-from mlsc.dataset import ShapesDataset
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler, Subset, random_split
+from mlsc import distributed as dist
+from mlsc.cache import open_cache
+from mlsc.dataset import (
+    PackedShapesDataset,
+    ShapesDataset,
+    SyntheticShapesDataset,
+    TensorBatchLoader,
+    load_tensors,
+    to_normalized_tensor,
+)
+from mlsc.generate_data import generate_arrays
 from mlsc.model import SimpleCNN
+from mlsc.optimize import autocast, grad_scaler, optimize_model
+from mlsc.profiling import StageTimer, trace_profiler
+
+
+def rng_state():
+    """RNG states driving shuffling, DataLoader worker seeds and dropout."""
+    state = {"torch": torch.get_rng_state(), "python": random.getstate()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    torch.set_rng_state(state["torch"])
+    random.setstate(state["python"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def save_checkpoint(path, checkpoint):
+    """
+    Writes to a temporary file first, so a crash while saving never leaves a
+    truncated checkpoint (or best model) in place of the previous one.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+
 
+def train(
+    packed_dir=None,
+    in_memory=False,
+    batch_size=32,
+    learning_rate=0.001,
+    num_epochs=10,
+    val_batch_size=None,
+    num_workers=0,
+    pin_memory=False,
+    persistent_workers=False,
+    prefetch_factor=None,
+    synthetic=False,
+    steps_per_epoch=50,
+    synthetic_val_size=400,
+    seed=None,
+    optimize=False,
+    precision="fp32",
+    profile=False,
+    profile_trace=None,
+    output="model.pth",
+    checkpoint=None,
+    checkpoint_every=1,
+    resume=None,
+    patience=None,
+    distributed=False,
+    dist_backend="gloo",
+    cache=True,
+    cache_dir=None,
+    cache_size_mb=1024,
+):
+    """
+    Trains SimpleCNN and saves the weights with the best validation accuracy
+    to `output`.
 
-def train():
-    # Device config
-    device = torch.device(
-        "cuda"
-        if torch.cuda.is_available()
-        else ("mps" if torch.backends.mps.is_available() else "cpu")
-    )
-    print(f"Using device: {device}")
+    Args:
+        packed_dir: Train from a dataset written by `mlsc pack` instead of
+            decoding the PNGs in data/raw on every epoch (optional)
+        in_memory: Load the whole dataset into one tensor on the training
+            device and iterate it by index slicing instead of a DataLoader
+        batch_size: Training batch size
+        learning_rate: Adam learning rate
+        num_epochs: Number of passes over the training split
+        val_batch_size: Validation batch size (default: batch_size)
+        num_workers: DataLoader worker processes (0 loads in the main process)
+        pin_memory: Use page-locked host buffers for faster copies to the GPU
+        persistent_workers: Keep DataLoader workers alive between epochs
+        prefetch_factor: Batches loaded in advance by each worker
+        synthetic: Train on an endless in-memory stream of generated shapes
+            instead of files (no `mlsc generate` step needed)
+        steps_per_epoch: Batches per epoch in synthetic mode
+        synthetic_val_size: Size of the fixed synthetic validation set
+        seed: Seed of the model init, shuffling, train/val split and
+            synthetic stream (default: random; a resumed run reuses the
+            checkpoint's seed)
+        optimize: Run the model channels-last and compiled with torch.compile
+            (falls back to eager when compile is unavailable)
+        precision: "fp32", "bf16" (autocast, CPU or GPU) or "fp16" (autocast
+            with gradient scaling, CUDA only)
+        profile: Print the time spent per stage (data loading, host to device
+            copy, forward, backward, optimizer step, validation), training
+            samples/s and peak memory after every epoch
+        profile_trace: Write a torch.profiler Chrome trace of the first
+            training steps to this path (optional)
+        output: Where the best model's state_dict is saved
+        checkpoint: Path of the checkpoint (model, optimizer, epoch, best
+            accuracy and RNG states) written during training (optional)
+        checkpoint_every: Epochs between checkpoints
+        resume: Checkpoint to continue training from; num_epochs counts the
+            epochs already done
+        patience: Stop after this many epochs without a validation accuracy
+            improvement (default: never)
+        distributed: Data-parallel training over the processes started by
+            torchrun: each rank trains on its shard of the data with
+            batch_size samples per step, gradients are all-reduced, metrics
+            are aggregated and only rank 0 prints and writes files
+        dist_backend: "gloo" (CPU, one or many hosts) or "nccl" (one GPU
+            per process)
+        cache: Read the images of data/raw through the tensor cache, so
+            repeated runs skip PNG decoding and normalization
+        cache_dir: Tensor cache directory (default: data/.cache/tensors)
+        cache_size_mb: Size bound of the tensor cache
 
-    # Hyperparameters
-    batch_size = 32
-    learning_rate = 0.001
-    num_epochs = 10
+    Returns:
+        Dictionary with the best validation accuracy and its epoch, the
+        number of epochs run, the last epoch's loss, the wall time in
+        seconds and the time of each epoch's training steps alone
+        (train_seconds, without validation and saving), or None when there
+        is no data
+    """
+    train_start = time.perf_counter()
+    if num_workers == 0 and (persistent_workers or prefetch_factor is not None):
+        raise ValueError("persistent_workers and prefetch_factor require num_workers > 0")
 
-    # Dataset
-    # Note: ShapesDataset defaults to looking in ../data/raw relative to dataset.py
-    # which is consistent with our structure
-    full_dataset = ShapesDataset()
+    if checkpoint_every < 1:
+        raise ValueError(f"checkpoint_every must be positive, got {checkpoint_every}")
 
-    if len(full_dataset) == 0:
-        print("Error: No data found! Run generate_data.py first.")
-        return
+    if patience is not None and patience < 1:
+        raise ValueError(f"Patience must be positive, got {patience}")
 
-    # Split train/val (80/20)
-    train_size = int(0.8 * len(full_dataset))
-    val_size = len(full_dataset) - train_size
-    train_dataset, val_dataset = random_split(full_dataset, [train_size, val_size])
+    rank, world_size = 0, 1
+    if distributed:
+        rank, world_size, device = dist.setup(dist_backend)
+    else:
+        # Device config
+        device = torch.device(
+            "cuda"
+            if torch.cuda.is_available()
+            else ("mps" if torch.backends.mps.is_available() else "cpu")
+        )
+
+    # Only rank 0 reports progress
+    log = print if rank == 0 else lambda *args, **kwargs: None
+    log(f"Using device: {device}" + (f" ({world_size} processes)" if distributed else ""))
+
+    if val_batch_size is None:
+        val_batch_size = batch_size
+
+    state = None
+    if resume is not None:
+        state = torch.load(resume, map_location="cpu", weights_only=True)
+        # The same seed gives the same train/val split and synthetic stream
+        seed = state["seed"]
+        log(f"Resuming from {resume} (epoch {state['epoch']}, best val acc {state['best_acc']:.2f}%)")
+    else:
+        if seed is None:
+            seed = random.randrange(2**32)
+        if distributed:
+            # Every rank must split and shuffle the data the same way
+            seed = dist.broadcast_object(seed)
+        torch.manual_seed(seed)  # model init and shuffling
+    split_generator = torch.Generator().manual_seed(seed)
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
+    loader_kwargs = {"num_workers": num_workers, "pin_memory": pin_memory}
+    if num_workers > 0:
+        loader_kwargs["persistent_workers"] = persistent_workers
+        loader_kwargs["prefetch_factor"] = prefetch_factor
+
+    train_sampler = None
+    if synthetic:
+        log(f"Training on synthetic stream (seed: {seed}, {steps_per_epoch} steps/epoch)")
+
+        # One iterator for the whole run, so epochs continue the stream
+        # instead of restarting it
+        stream = SyntheticShapesDataset(batch_size, seed, rank=rank)
+        train_loader = DataLoader(stream, batch_size=None, **loader_kwargs)
+        train_iter = iter(train_loader)
+
+        val_images, val_labels = generate_arrays(synthetic_val_size // 2, seed)
+        val_loader = TensorBatchLoader(
+            to_normalized_tensor(val_images[rank::world_size]).to(device),
+            torch.from_numpy(val_labels[rank::world_size]).to(device),
+            val_batch_size,
+        )
+    else:
+        # Dataset
+        # Note: ShapesDataset defaults to looking in ../data/raw relative to dataset.py
+        # which is consistent with our structure
+        if packed_dir is not None:
+            full_dataset = PackedShapesDataset(packed_dir)
+        else:
+            full_dataset = ShapesDataset(
+                cache=open_cache(cache_dir, cache_size_mb) if cache else None
+            )
+
+        if len(full_dataset) == 0:
+            log("Error: No data found! Run generate_data.py first.")
+            if distributed:
+                dist.cleanup()
+            return
+
+        # Split train/val (80/20)
+        train_size = int(0.8 * len(full_dataset))
+        val_size = len(full_dataset) - train_size
+        if in_memory:
+            images, labels = load_tensors(full_dataset)
+            images, labels = images.to(device), labels.to(device)
+            indices = torch.randperm(len(full_dataset), generator=split_generator).to(device)
+            train_idx, val_idx = indices[:train_size], indices[train_size:]
+            # Each rank keeps every world_size-th sample of both splits. Like
+            # DistributedSampler, the train split is padded with its first
+            # samples so every rank runs the same number of steps (DDP's
+            # gradient all-reduce hangs otherwise); validation runs no
+            # collectives and keeps disjoint shards
+            train_idx = torch.cat([train_idx, train_idx[:(-train_size) % world_size]])
+            train_idx = train_idx[rank::world_size]
+            val_idx = val_idx[rank::world_size]
+            log(f"Loaded {len(full_dataset)} samples into memory on {device}")
+
+            train_loader = TensorBatchLoader(
+                images[train_idx], labels[train_idx], batch_size, shuffle=True
+            )
+            val_loader = TensorBatchLoader(
+                images[val_idx], labels[val_idx], val_batch_size
+            )
+        else:
+            train_dataset, val_dataset = random_split(
+                full_dataset, [train_size, val_size], generator=split_generator
+            )
+
+            if distributed:
+                # Reshuffled every epoch (set_epoch), padded to equal shards
+                train_sampler = DistributedSampler(train_dataset, shuffle=True, seed=seed)
+                # Disjoint shards, so aggregated accuracy counts each sample once
+                val_dataset = Subset(val_dataset, range(rank, val_size, world_size))
+
+            train_loader = DataLoader(
+                train_dataset,
+                batch_size=batch_size,
+                shuffle=train_sampler is None,
+                sampler=train_sampler,
+                **loader_kwargs,
+            )
+            val_loader = DataLoader(
+                val_dataset, batch_size=val_batch_size, shuffle=False, **loader_kwargs
+            )
 
     # Model
     model = SimpleCNN().to(device)
@@ -53,54 +284,158 @@ def train():
     # Loss and Optimizer
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=learning_rate)
+    scaler = grad_scaler(device, precision)
+    autocast(device, precision)  # validate before loading any batch
+
+    start_epoch = 0
+    best_acc = -1.0
+    best_epoch = 0
+    epochs_run = 0
+    epoch_loss = float("nan")
+    if state is not None:
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        scaler.load_state_dict(state["scaler"])
+        start_epoch = state["epoch"]
+        best_acc = state["best_acc"]
+        best_epoch = state["best_epoch"]
+        set_rng_state(state["rng"])
+        if synthetic:
+            # Continue the stream where the interrupted run left it
+            for _ in islice(train_iter, start_epoch * steps_per_epoch):
+                pass
+
+    forward = model
+    if distributed:
+        if optimize:
+            # Before wrapping, so DDP's gradient buckets match the layout
+            model.to(memory_format=torch.channels_last)
+        # Broadcasts rank 0's weights, then all-reduces gradients in backward()
+        forward = DistributedDataParallel(model)
+    if optimize:
+        forward = optimize_model(forward)
+
+    timer = StageTimer(device, enabled=profile)
+    profiler = trace_profiler(device, profile_trace) if profile_trace and rank == 0 else None
+    if profiler is not None:
+        profiler.start()
 
-    print(f"Starting training for {num_epochs} epochs...")
+    log(f"Starting training for {num_epochs} epochs ({precision})...")
+    train_seconds = []
 
     # Train Loop
-    for epoch in range(num_epochs):
+    for epoch in range(start_epoch, num_epochs):
+        epoch_start = time.perf_counter()
         model.train()
         running_loss = 0.0
+        num_batches = 0
+        timer.reset()
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
 
-        for images, labels in train_loader:
-            images = images.to(device)
-            labels = labels.to(device)
+        batches = islice(train_iter, steps_per_epoch) if synthetic else train_loader
+        steps_start = time.perf_counter()
+        for images, labels in batches:
+            timer.lap("data")
+            images = images.to(device, non_blocking=pin_memory)
+            labels = labels.to(device, non_blocking=pin_memory)
+            timer.lap("h2d")
 
             # Forward
-            outputs = model(images)
-            loss = criterion(outputs, labels)
+            with autocast(device, precision):
+                outputs = forward(images)
+                loss = criterion(outputs, labels)
+            timer.lap("forward")
 
             # Backward
             optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
+            scaler.scale(loss).backward()
+            timer.lap("backward")
+            scaler.step(optimizer)
+            scaler.update()
 
             running_loss += loss.item()
+            num_batches += 1
+            timer.samples += labels.size(0)
+            timer.lap("optimizer")
+            if profiler is not None:
+                profiler.step()
+        # loss.item() already waited for the last step's kernels
+        train_seconds.append(time.perf_counter() - steps_start)
 
         # Validation Loop
         model.eval()
         correct = 0
         total = 0
 
-        with torch.no_grad():
+        with torch.no_grad(), autocast(device, precision):
             for images, labels in val_loader:
-                images = images.to(device)
-                labels = labels.to(device)
+                images = images.to(device, non_blocking=pin_memory)
+                labels = labels.to(device, non_blocking=pin_memory)
 
-                outputs = model(images)
+                outputs = forward(images)
                 _, predicted = torch.max(outputs.data, 1)
                 total += labels.size(0)
                 correct += (predicted == labels).sum().item()
 
+        if distributed:
+            running_loss, num_batches, correct, total = dist.all_reduce_sum(
+                device, running_loss, num_batches, correct, total
+            )
+
         val_acc = 100 * correct / total
-        print(
-            f"Epoch [{epoch + 1}/{num_epochs}], Loss: {running_loss / len(train_loader):.4f}, Val Acc: {val_acc:.2f}%"
+        epoch_loss = running_loss / num_batches
+        epochs_run = epoch + 1
+        timer.lap("validation")
+        log(
+            f"Epoch [{epoch + 1}/{num_epochs}], Loss: {epoch_loss:.4f}, Val Acc: {val_acc:.2f}%, "
+            f"Time: {time.perf_counter() - epoch_start:.1f}s"
         )
+        if profile:
+            log(timer.summary())
+
+        # val_acc is the same on every rank, so they all stop together
+        if val_acc > best_acc:
+            best_acc, best_epoch = val_acc, epoch + 1
+            if rank == 0:
+                save_checkpoint(output, model.state_dict())
+
+        if rank == 0 and checkpoint is not None and (
+            (epoch + 1) % checkpoint_every == 0 or epoch + 1 == num_epochs
+        ):
+            save_checkpoint(checkpoint, {
+                "model": model.state_dict(),
+                "optimizer": optimizer.state_dict(),
+                "scaler": scaler.state_dict(),
+                "epoch": epoch + 1,
+                "best_acc": best_acc,
+                "best_epoch": best_epoch,
+                "seed": seed,
+                "rng": rng_state(),
+            })
+
+        if patience is not None and epoch + 1 - best_epoch >= patience:
+            log(f"Early stopping: no improvement for {patience} epochs")
+            break
+
+    if profiler is not None:
+        profiler.stop()
+
+    if distributed:
+        dist.cleanup()
+
+    # The best model is saved as soon as it is found, so an interrupted run
+    # still leaves it in place
+    log(f"Best model (epoch {best_epoch}, Val Acc: {best_acc:.2f}%) saved to {output}")
 
-    # Save Model
-    # Save in the root mlsc/ directory from where we likely run it, or relative to this script
-    # User prompt just says "Salva o modelo final."
-    torch.save(model.state_dict(), "model.pth")
-    print("Model saved to model.pth")
+    return {
+        "best_acc": best_acc,
+        "best_epoch": best_epoch,
+        "epochs": epochs_run,
+        "loss": epoch_loss,
+        "seconds": time.perf_counter() - train_start,
+        "train_seconds": train_seconds,
+    }
 
 
 if __name__ == "__main__":